@@ -0,0 +1,106 @@
+"""
+activity.py — Live author activity counters for $summary active
+---------------------------------------------------------------
+
+ActivityTracker keeps, per channel, how many messages each author posted
+over a few sliding windows (1h / 24h / 7d by default).
+
+Each window is a ring of time buckets plus running per-author totals:
+- record() adds to the newest bucket and the totals, O(1) per message
+- buckets that slide out of the window are subtracted from the totals,
+  so old activity ages out without rescanning any history
+- top() answers straight from the totals, no Discord API or DB access
+
+seed() rebuilds a channel's counters from stored history, e.g. on startup
+or after a reconnect, so counts survive restarts.
+"""
+
+import heapq
+from collections import Counter, deque
+from datetime import datetime, timezone
+
+# name -> (bucket length in seconds, number of buckets)
+ACTIVITY_WINDOWS = {
+    "1h": (60, 60),
+    "24h": (3600, 24),
+    "7d": (6 * 3600, 28),
+}
+DEFAULT_ACTIVITY_WINDOW = "24h"
+
+
+def _epoch_ms(ts: datetime) -> int:
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return int(ts.timestamp() * 1000)
+
+
+class SlidingWindowCounter:
+    def __init__(self, bucket_seconds: int, bucket_count: int):
+        self.bucket_ms = bucket_seconds * 1000
+        self.bucket_count = bucket_count
+        self._buckets: deque[tuple[int, Counter]] = deque()  # (bucket index, counts), oldest first
+        self._totals: Counter = Counter()
+
+    def _expire(self, index: int):
+        while self._buckets and self._buckets[0][0] <= index - self.bucket_count:
+            _, counts = self._buckets.popleft()
+            for author, n in counts.items():
+                remaining = self._totals[author] - n
+                if remaining > 0:
+                    self._totals[author] = remaining
+                else:
+                    del self._totals[author]
+
+    def add(self, author: str, epoch_ms: int):
+        index = epoch_ms // self.bucket_ms
+        if self._buckets:
+            newest = self._buckets[-1][0]
+            if index <= newest - self.bucket_count:
+                return  # already outside the window
+            # Slightly late arrivals are counted in the newest bucket
+            index = max(index, newest)
+        self._expire(index)
+
+        if not self._buckets or self._buckets[-1][0] != index:
+            self._buckets.append((index, Counter()))
+        self._buckets[-1][1][author] += 1
+        self._totals[author] += 1
+
+    def top(self, count: int, now_ms: int) -> list[tuple[str, int]]:
+        self._expire(now_ms // self.bucket_ms)
+        return heapq.nlargest(count, self._totals.items(), key=lambda item: item[1])
+
+
+class ActivityTracker:
+    def __init__(self, windows: dict[str, tuple[int, int]] = ACTIVITY_WINDOWS):
+        self.windows = windows
+        self._channels: dict[int, dict[str, SlidingWindowCounter]] = {}
+
+    def _new_counters(self) -> dict[str, SlidingWindowCounter]:
+        return {name: SlidingWindowCounter(*spec) for name, spec in self.windows.items()}
+
+    def is_tracking(self, channel_id: int) -> bool:
+        return channel_id in self._channels
+
+    def record(self, channel_id: int, author: str, timestamp: datetime):
+        counters = self._channels.get(channel_id)
+        if counters is None:
+            counters = self._channels[channel_id] = self._new_counters()
+        epoch_ms = _epoch_ms(timestamp)
+        for counter in counters.values():
+            counter.add(author, epoch_ms)
+
+    def seed(self, channel_id: int, history: list[tuple[str, str, datetime]]):
+        # history: oldest-first (author, content, ts), replaces current counts
+        self._channels[channel_id] = self._new_counters()
+        for author, _, ts in history:
+            self.record(channel_id, author, ts)
+
+    def longest_window_seconds(self) -> int:
+        return max(seconds * count for seconds, count in self.windows.values())
+
+    def top(self, channel_id: int, window: str, count: int = 10) -> list[tuple[str, int]]:
+        counters = self._channels.get(channel_id)
+        if counters is None or window not in counters:
+            return []
+        return counters[window].top(count, _epoch_ms(datetime.now(timezone.utc)))
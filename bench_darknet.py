@@ -0,0 +1,284 @@
+"""
+bench_darknet.py — Replay benchmark for the Darknet moderation path
+-------------------------------------------------------------------
+
+Replays AO relay lines ("[WTS] ... [Name] [Ignore]") through the real
+bot.handle_darknet_message handler at a chosen arrival rate, with stub
+Discord objects and the in-process FakeProvider (llm.py) instead of
+Gemini. Every stage runs for real: text extraction, pre-filter, verdict
+caches, micro-batching, the LLM scheduler and the embed send.
+
+Reports throughput and p50/p95/p99 end-to-end latency per message
+(arrival until its verdict is posted, or a clean one handed to the
+digest in outbound.py), plus Discord and LLM call counts, so
+regressions show up before deploy. Messages deferred while Gemini is
+failing are reported separately, timed until their re-evaluated verdict
+is posted; the replay waits for the re-evaluation queue to drain.
+
+Usage:
+    python bench_darknet.py                       synthetic log, defaults
+    python bench_darknet.py --log relay.txt       one relay line per line
+    python bench_darknet.py --rate 50 --count 2000 --llm-ms 800 --failure-rate 0.05
+"""
+
+import os
+import time
+import random
+import asyncio
+import argparse
+import contextlib
+
+import llm
+import bot
+import moderation
+
+# Synthetic relay traffic: mostly trade spam, some chatter, a few violations
+SYNTHETIC_CHANNELS = ("[WTS]", "[WTB]", "[General]", "[Lootrights]")
+SYNTHETIC_ITEMS = (
+    "beast armor", "alien armor full set", "QL300 implants", "ofab weapons",
+    "sided shades", "ljotur helmet", "pvp ready nt", "apf sectors"
+)
+SYNTHETIC_CHATTER = (
+    "who wants some tower fields?", "lf team for s42", "anyone up for pande?",
+    "what is the best nano for engis", "gratz on 220!"
+)
+SYNTHETIC_VIOLATIONS = (
+    "selling aosharp scripts cheap pm me", "new exploit for dupes, pm for info",
+    "scam alert he never paid lol"
+)
+SYNTHETIC_NAMES = ("Madasadoc", "Jjjee940", "Buffbot", "Nanomage", "Tradeguy")
+
+
+# ---------------------------------------------------------
+# Stub Discord objects
+# ---------------------------------------------------------
+class StubRole:
+    mention = "<@&0>"
+
+
+class StubGuild:
+    def get_role(self, role_id: int):
+        return StubRole()
+
+
+class StubAuthor:
+    def __init__(self, name: str):
+        self.name = name
+
+
+class StubSentMessage:
+    def __init__(self, channel: "StubChannel"):
+        self.channel = channel
+        self.id = channel.next_id()
+
+    async def edit(self, **kwargs):
+        self.channel.edits += 1
+        await asyncio.sleep(self.channel.send_ms / 1000)
+        return self
+
+
+class StubChannel:
+    """Counts sends and edits and simulates the Discord round-trip of each one."""
+
+    def __init__(self, send_ms: float):
+        self.id = bot.DARKNET_CHANNEL_ID
+        self.send_ms = send_ms
+        self.sends = 0
+        self.edits = 0
+        self._last_id = 0
+
+    def next_id(self) -> int:
+        # Increasing like Discord snowflakes
+        self._last_id += 1
+        return self._last_id
+
+    async def send(self, content=None, embed=None, **kwargs):
+        self.sends += 1
+        await asyncio.sleep(self.send_ms / 1000)
+        return StubSentMessage(self)
+
+
+class StubMessage:
+    def __init__(self, content: str, channel: StubChannel, guild: StubGuild):
+        self.id = channel.next_id()
+        self.content = content
+        self.embeds = []
+        self.author = StubAuthor(bot.TARGET_USERNAME)
+        self.channel = channel
+        self.guild = guild
+        self.finished: float | None = None  # when its verdict was posted
+
+
+# ---------------------------------------------------------
+# Relay log
+# ---------------------------------------------------------
+def synthetic_log(count: int, rng: random.Random, repeat_ratio: float = 0.3,
+                  violation_ratio: float = 0.05) -> list[str]:
+    lines = []
+    for _ in range(count):
+        if lines and rng.random() < repeat_ratio:
+            # Relay spam: the same advert posted again
+            lines.append(rng.choice(lines[-50:]))
+            continue
+
+        roll = rng.random()
+        if roll < violation_ratio:
+            body = rng.choice(SYNTHETIC_VIOLATIONS)
+        elif roll < 0.3:
+            body = rng.choice(SYNTHETIC_CHATTER)
+        else:
+            body = f"{rng.choice(SYNTHETIC_ITEMS)} {rng.randint(1, 999)}m pm me"
+        lines.append(f"{rng.choice(SYNTHETIC_CHANNELS)} {body} [{rng.choice(SYNTHETIC_NAMES)}] [Ignore]")
+    return lines
+
+
+def load_log(path: str) -> list[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+# ---------------------------------------------------------
+# Replay
+# ---------------------------------------------------------
+def percentile(ordered: list[float], fraction: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[int(fraction * (len(ordered) - 1))]
+
+
+async def drain_reevaluations(timeout: float) -> bool:
+    """Waits until every deferred message has been re-evaluated (or given up on)."""
+    queue = moderation.reevaluation_queue
+    deadline = time.monotonic() + timeout
+    while len(queue) or (queue._task is not None and not queue._task.done()):
+        if time.monotonic() >= deadline:
+            return False
+        await asyncio.sleep(0.1)
+    return True
+
+
+async def replay(lines: list[str], rate: float, send_ms: float, rng: random.Random,
+                 drain_timeout: float) -> dict:
+    channel = StubChannel(send_ms)
+    guild = StubGuild()
+    latencies: list[float] = []
+    deferred: list[tuple[float, StubMessage]] = []
+
+    # Both the direct path and the re-evaluation callback post through here
+    post_analysis = bot.handle_darknet_analysis
+
+    async def timed_analysis(message, text_to_check, analysis):
+        await post_analysis(message, text_to_check, analysis)
+        message.finished = time.monotonic()
+
+    async def handle(line: str):
+        started = time.monotonic()
+        message = StubMessage(line, channel, guild)
+        # As bot.on_message does: the relay line lands below the current digest
+        bot.moderation_posts.note_message(message)
+        await bot.handle_darknet_message(message)
+        if message.finished is not None:
+            latencies.append(message.finished - started)
+        else:
+            deferred.append((started, message))
+
+    bot.handle_darknet_analysis = timed_analysis
+    try:
+        started = time.monotonic()
+        tasks = []
+        for line in lines:
+            tasks.append(asyncio.create_task(handle(line)))
+            if rate > 0:
+                # Poisson arrivals at the requested mean rate
+                await asyncio.sleep(rng.expovariate(rate))
+        await asyncio.gather(*tasks)
+        elapsed = time.monotonic() - started
+
+        drained = await drain_reevaluations(drain_timeout)
+    finally:
+        bot.handle_darknet_analysis = post_analysis
+
+    # Post the clean verdicts still waiting for their digest
+    await bot.moderation_posts.flush()
+
+    ordered = sorted(latencies)
+    deferred_ordered = sorted(m.finished - t for t, m in deferred if m.finished is not None)
+    return {
+        "messages": len(lines),
+        "completed": len(latencies),
+        "elapsed": elapsed,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": percentile(ordered, 0.50),
+        "p95": percentile(ordered, 0.95),
+        "p99": percentile(ordered, 0.99),
+        "max": ordered[-1] if ordered else 0.0,
+        "deferred": len(deferred),
+        "deferred_done": len(deferred_ordered),
+        "deferred_p50": percentile(deferred_ordered, 0.50),
+        "deferred_max": deferred_ordered[-1] if deferred_ordered else 0.0,
+        "drained": drained,
+        "sends": channel.sends,
+        "edits": channel.edits
+    }
+
+
+def print_report(result: dict, provider: llm.FakeProvider):
+    print("\n=== Darknet replay benchmark ===")
+    print(f"Messages:      {result['messages']} in {result['elapsed']:.2f}s, "
+          f"{result['completed']} answered on arrival")
+    print(f"Throughput:    {result['throughput']:.1f} msg/s")
+    print(
+        f"Latency (ms):  p50 {1000 * result['p50']:.0f}  p95 {1000 * result['p95']:.0f}"
+        f"  p99 {1000 * result['p99']:.0f}  max {1000 * result['max']:.0f}"
+    )
+    if result["deferred"]:
+        print(
+            f"Deferred:      {result['deferred']} ({result['deferred_done']} posted after re-evaluation, "
+            f"p50 {1000 * result['deferred_p50']:.0f} ms  max {1000 * result['deferred_max']:.0f} ms)"
+        )
+        if not result["drained"]:
+            print("               re-evaluation queue did not drain before --drain-timeout")
+    print(f"Discord calls: {result['sends']} sends, {result['edits']} edits")
+    print(f"LLM calls:     {provider.calls} ({provider.failures} failed)")
+    print(f"Verdict cache: {moderation.verdict_cache.stats()}")
+    print(f"Breaker:       {moderation.breaker.state} ({moderation.breaker.trips} trips), "
+          f"{len(moderation.reevaluation_queue)} awaiting re-evaluation")
+    print(f"Scheduler:     {llm.scheduler_stats()['moderation']}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Replay Darknet relay lines through the moderation handler.")
+    parser.add_argument("--log", help="file with one relay line per line (default: synthetic)")
+    parser.add_argument("--count", type=int, default=500, help="synthetic lines to generate")
+    parser.add_argument("--rate", type=float, default=20.0, help="arrivals per second (0 = all at once)")
+    parser.add_argument("--llm-ms", type=float, default=300.0, help="fake LLM latency")
+    parser.add_argument("--llm-jitter-ms", type=float, default=100.0, help="fake LLM latency jitter")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of fake LLM calls that fail")
+    parser.add_argument("--send-ms", type=float, default=50.0, help="simulated Discord send latency")
+    parser.add_argument("--drain-timeout", type=float, default=120.0,
+                        help="seconds to wait for deferred messages to be re-evaluated")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="keep the bot's DEBUG output")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    lines = load_log(args.log) if args.log else synthetic_log(args.count, rng)
+
+    provider = llm.FakeProvider(
+        latency_ms=args.llm_ms,
+        jitter_ms=args.llm_jitter_ms,
+        failure_rate=args.failure_rate,
+        seed=args.seed
+    )
+    llm.set_provider(provider)
+
+    if args.verbose:
+        result = await replay(lines, args.rate, args.send_ms, rng, args.drain_timeout)
+    else:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            result = await replay(lines, args.rate, args.send_ms, rng, args.drain_timeout)
+    print_report(result, provider)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,613 +1,661 @@
-"""
-bot.py — Nyx Discord Bot
-------------------------
-
-Modules included:
-- External file loaders (rules.txt, moderationguide.txt, wisdom.txt)
-- Darknet moderation system (Gemini-based)
-- Summary system ($summary) with DM support
-- Wisdom system ($wisdom) with random quotes
-- Message caching for summaries
-- Topic analysis and summarization via Gemini
-- Clean structure for maintainability
-
-This file is generated as a complete, unified bot script.
-"""
-
-import os
-import json
-import random
-import discord
-from discord.ext import commands
-from dotenv import load_dotenv
-from google import genai
-from datetime import datetime, timedelta, timezone
-import asyncio
-import re
-from collections import Counter
-from recruit import handle_recruit_message
-
-# Load environment variables
-load_dotenv()
-DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-
-# Configure Gemini client
-client_gemini = genai.Client(api_key=GEMINI_API_KEY)
-
-# Discord intents
-intents = discord.Intents.default()
-intents.message_content = True
-
-bot = commands.Bot(command_prefix="!", intents=intents)
-
-# Channel + role settings
-DARKNET_CHANNEL_ID = 1327958045099294730
-TARGET_USERNAME = "nadyap"
-MOD_ROLE_ID = 1387473445536661585
-
-# Rolling caches (max 1000 messages each)
-MAX_CACHE = 1000
-generals_cache: list[tuple[str, str, datetime]] = []
-officer_cache: list[tuple[str, str, datetime]] = []
-
-def extract_message_text(message):
-    """
-    Extracts the AO relay text for Darknet moderation.
-    Keeps the channel tag ([WTB], [WTS], [General], etc.)
-    but strips the trailing [Name] [Ignore] pair.
-    """
-    text = message.content
-
-    # Strip trailing [Name] [Ignore], but keep everything before it
-    # Examples:
-    #   "[WTB] beast armor ... [Madasadoc] [Ignore]"
-    #   "[General] who wants some tower fields? [Jjjee940] [Ignore]"
-    text = re.sub(
-        r"\s*\[[A-Za-z0-9_-]{3,20}\]\s*\[Ignore\]\s*$",
-        "",
-        text,
-    ).strip()
-
-    return text
-
-
-# ---------------------------------------------------------
-# Load external files
-# ---------------------------------------------------------
-def load_rules():
-    try:
-        with open("rules.txt", "r", encoding="utf-8") as f:
-            return f.read().strip()
-    except FileNotFoundError:
-        return "No rules found."
-
-def load_moderation_guidance():
-    try:
-        with open("moderationguide.txt", "r", encoding="utf-8") as f:
-            return f.read().strip()
-    except FileNotFoundError:
-        return "You are an automated moderation system."
-
-def load_wisdom_quotes():
-    try:
-        with open("wisdom.txt", "r", encoding="utf-8") as f:
-            lines = [line.strip() for line in f.readlines() if line.strip()]
-            return lines
-    except FileNotFoundError:
-        return []
-
-RULES_TEXT = load_rules()
-MODERATION_GUIDANCE = load_moderation_guidance()
-WISDOM_QUOTES = load_wisdom_quotes()
-
-# ---------------------------------------------------------
-# Extract text from message + embeds
-# ---------------------------------------------------------
-def extract_message_text(message: discord.Message) -> str:
-    parts = []
-
-    if message.content:
-        parts.append(message.content)
-
-    for embed in message.embeds:
-        if embed.title:
-            parts.append(embed.title)
-        if embed.description:
-            parts.append(embed.description)
-        for field in embed.fields:
-            parts.append(f"{field.name}: {field.value}")
-        if embed.footer and embed.footer.text:
-            parts.append(embed.footer.text)
-
-    text = "\n".join(parts).strip()
-
-    # Remove trailing [Name] [Ignore] but keep everything else
-    text = re.sub(
-        r"\s*\[[A-Za-z0-9_-]{3,20}\]\s*\[Ignore\]\s*$",
-        "",
-        text,
-    ).strip()
-
-    return text
-# ---------------------------------------------------------
-# GEMINI MODERATION (Darknet ONLY)
-# ---------------------------------------------------------
-async def analyse_message_moderation(message_text: str) -> dict:
-    system_prompt = (
-        MODERATION_GUIDANCE
-        + "\n\nRules:\n"
-        + RULES_TEXT
-        + "\n\nContextual Notes:\n"
-          "- In Anarchy Online trade messages, the word 'free' inside a WTS (want to sell) message is normal trade language. "
-          "It does not indicate begging, solicitation, manipulation, or any rule-breaking. "
-          "Do not flag 'free' as a violation when it appears in a WTS context.\n"
-    )
-
-    try:
-        response = client_gemini.models.generate_content(
-            model="models/gemini-2.5-flash",
-            contents=[{
-                "role": "user",
-                "parts": [{"text": system_prompt + "\n\nMessage:\n" + message_text}]
-            }]
-        )
-
-        raw = (response.text or "").strip()
-        if raw.startswith("```"):
-            raw = raw.strip("`").strip()
-        if raw.lower().startswith("json"):
-            raw = raw[4:].strip()
-
-        return json.loads(raw)
-
-    except Exception:
-        return {
-            "violation": False,
-            "rule": "",
-            "reason": "Gemini API error",
-            "recommended_action": "No Action",
-            "short_summary": "No violation detected.",
-            "confidence": 0.0
-        }
-
-# ---------------------------------------------------------
-# GEMINI SUMMARIZER
-# ---------------------------------------------------------
-async def summarise_text(text: str) -> str:
-    prompt = (
-        "Summarize the following Discord messages in under 100 words. "
-        "Include usernames when relevant. Focus on the main themes and actions.\n\n"
-        + text
-    )
-
-    try:
-        response = client_gemini.models.generate_content(
-            model="models/gemini-2.5-flash",
-            contents=[{"role": "user", "parts": [{"text": prompt}]}]
-        )
-        return (response.text or "").strip()
-
-    except Exception:
-        return "Summary unavailable due to AI error."
-
-# ---------------------------------------------------------
-# GEMINI TOPIC ANALYSIS
-# ---------------------------------------------------------
-async def summarise_topics(text: str) -> str:
-    prompt = (
-        "Identify the main discussion topics in the following Discord messages. "
-        "List 3–6 themes with short explanations. "
-        "Do NOT include usernames.\n\n"
-        + text
-    )
-
-    try:
-        response = client_gemini.models.generate_content(
-            model="models/gemini-2.5-flash",
-            contents=[{"role": "user", "parts": [{"text": prompt}]}]
-        )
-        return (response.text or "").strip()
-
-    except Exception:
-        return "Topic analysis unavailable due to AI error."
-
-# ---------------------------------------------------------
-# Build summary text from message tuples
-# ---------------------------------------------------------
-async def summarize_messages(messages: list[tuple[str, str, datetime]]) -> str:
-    if not messages:
-        return "No messages available to summarize."
-    text_block = "\n".join([f"{author}: {content}" for author, content, ts in messages])
-    return await summarise_text(text_block)
-
-# ---------------------------------------------------------
-# Safe history fetch
-# ---------------------------------------------------------
-async def safe_fetch_history(channel: discord.TextChannel, limit: int) -> list[tuple[str, str, datetime]]:
-    messages: list[tuple[str, str, datetime]] = []
-    try:
-        async for msg in channel.history(limit=limit):
-            messages.append((msg.author.display_name, msg.content, msg.created_at))
-    except discord.HTTPException:
-        await asyncio.sleep(1)
-    return messages
-
-# ---------------------------------------------------------
-# Cache handler
-# ---------------------------------------------------------
-def add_to_cache(channel_id: int, author: str, content: str, timestamp: datetime):
-    cache = generals_cache if channel_id == 1417799716275621989 else officer_cache
-    cache.append((author, content, timestamp))
-    if len(cache) > MAX_CACHE:
-        cache.pop(0)
-# ---------------------------------------------------------
-# Discord events
-# ---------------------------------------------------------
-@client.event
-async def on_ready():
-    print(f"Logged in as {client.user}")
-    print("Bot connected and ready")
-@client.event
-async def on_message(message: discord.Message):
-    if message.author == client.user:
-        return
-    # -----------------------------------
-    # RECRUITMENT SYSTEM HOOK (ADD THIS)
-    # -----------------------------------
-    handled = await handle_recruit_message(client, message)
-    if handled:
-        return
-    # Cache messages for summary commands
-    if message.channel.id == 1417799716275621989:
-        add_to_cache(1417799716275621989, message.author.display_name, message.content, message.created_at)
-
-    if message.channel.id == 545294570091446280:
-        add_to_cache(545294570091446280, message.author.display_name, message.content, message.created_at)
-
-    # -----------------------------------------------------
-    # $wisdom command (global)
-    # -----------------------------------------------------
-    if message.content.strip().lower() == "$wisdom":
-        if not WISDOM_QUOTES:
-            await message.channel.send("No wisdom available.")
-            return
-
-        quote = random.choice(WISDOM_QUOTES)
-
-        embed = discord.Embed(
-            title="A word of wisdom",
-            description=quote,
-            color=discord.Color.from_rgb(255, 255, 255)
-        )
-
-        await message.channel.send(embed=embed)
-        return
-
-    # -----------------------------------------------------
-    # SUMMARY COMMANDS (GLOBAL + ROLE-LOCKED)
-    # -----------------------------------------------------
-    if message.content.startswith("$summary"):
-
-        allowed_roles = ["officer", "general"]
-        user_roles = [role.name.lower() for role in message.author.roles]
-
-        if not any(role in allowed_roles for role in user_roles):
-            await message.channel.send("You don’t have permission to use this command.")
-            return
-
-        parts = message.content.split()
-        channel_name = message.channel.name
-
-        # Determine which cache to use
-        if message.channel.id == 545294570091446280:
-            cache = officer_cache
-        else:
-            cache = generals_cache
-
-        # -------------------------------------------------
-        # $summary <number>
-        # -------------------------------------------------
-        if len(parts) == 2 and parts[1].isdigit():
-            count = int(parts[1])
-
-            if len(cache) >= count:
-                history = cache[-count:]
-            else:
-                missing = count - len(cache)
-                fetched = await safe_fetch_history(message.channel, missing + 1)
-                history = fetched + cache
-                history = history[-count:]
-
-            summary = await summarize_messages(history)
-
-            embed = discord.Embed(
-                title=f"Summary of #{channel_name} — Last {count} Messages",
-                description=summary,
-                color=discord.Color.blue()
-            )
-
-            try:
-                await message.author.send(embed=embed)
-            except discord.Forbidden:
-                pass
-
-            return
-
-        # -------------------------------------------------
-        # $summary daily
-        # -------------------------------------------------
-        if len(parts) == 2 and parts[1].lower() == "daily":
-            cutoff = datetime.now(timezone.utc) - timedelta(hours=24)
-            fetched = await safe_fetch_history(message.channel, 1000)
-            history = [(a, c, ts) for (a, c, ts) in fetched if ts >= cutoff]
-
-            if not history:
-                await message.author.send("No messages found in the last 24 hours.")
-                return
-
-            summary = await summarize_messages(history)
-
-            embed = discord.Embed(
-                title=f"Daily Summary of #{channel_name}",
-                description=summary,
-                color=discord.Color.blue()
-            )
-
-            try:
-                await message.author.send(embed=embed)
-            except discord.Forbidden:
-                pass
-
-            return
-
-        # -------------------------------------------------
-        # $summary weekly
-        # -------------------------------------------------
-        if len(parts) == 2 and parts[1].lower() == "weekly":
-            cutoff = datetime.now(timezone.utc) - timedelta(days=7)
-            fetched = await safe_fetch_history(message.channel, 3000)
-            history = [(a, c, ts) for (a, c, ts) in fetched if ts >= cutoff]
-
-            if not history:
-                await message.author.send("No messages found in the last 7 days.")
-                return
-
-            summary = await summarize_messages(history)
-
-            embed = discord.Embed(
-                title=f"Weekly Summary of #{channel_name}",
-                description=summary,
-                color=discord.Color.blue()
-            )
-
-            try:
-                await message.author.send(embed=embed)
-            except discord.Forbidden:
-                pass
-
-            return
-
-        # -------------------------------------------------
-        # $summary monthly
-        # -------------------------------------------------
-        if len(parts) == 2 and parts[1].lower() == "monthly":
-            cutoff = datetime.now(timezone.utc) - timedelta(days=30)
-            fetched = await safe_fetch_history(message.channel, 5000)
-            history = [(a, c, ts) for (a, c, ts) in fetched if ts >= cutoff]
-
-            if not history:
-                await message.author.send("No messages found in the last 30 days.")
-                return
-
-            summary = await summarize_messages(history)
-
-            embed = discord.Embed(
-                title=f"Monthly Summary of #{channel_name}",
-                description=summary,
-                color=discord.Color.blue()
-            )
-
-            try:
-                await message.author.send(embed=embed)
-            except discord.Forbidden:
-                pass
-
-            return
-
-        # -------------------------------------------------
-        # $summary keyword <word>
-        # -------------------------------------------------
-        if len(parts) == 3 and parts[1].lower() == "keyword":
-            keyword = parts[2].lower()
-            fetched = await safe_fetch_history(message.channel, 500)
-            history = [(a, c, ts) for (a, c, ts) in fetched if keyword in c.lower()]
-
-            if not history:
-                await message.author.send(f"No messages found containing '{keyword}'.")
-                return
-
-            summary = await summarize_messages(history)
-
-            embed = discord.Embed(
-                title=f"Keyword Summary of #{channel_name}: {keyword}",
-                description=summary,
-                color=discord.Color.blue()
-            )
-
-            try:
-                await message.author.send(embed=embed)
-            except discord.Forbidden:
-                pass
-
-            return
-
-        # -------------------------------------------------
-        # $summary user <nickname>
-        # -------------------------------------------------
-        if len(parts) == 3 and parts[1].lower() == "user":
-            target = parts[2].lower()
-            fetched = await safe_fetch_history(message.channel, 2000)
-            history = [(a, c, ts) for (a, c, ts) in fetched if a.lower() == target]
-
-            if not history:
-                await message.author.send(f"No messages found from user '{target}'.")
-                return
-
-            summary = await summarize_messages(history)
-
-            embed = discord.Embed(
-                title=f"User Summary of #{channel_name}: {target}",
-                description=summary,
-                color=discord.Color.blue()
-            )
-
-            try:
-                await message.author.send(embed=embed)
-            except discord.Forbidden:
-                pass
-
-            return
-
-        # -------------------------------------------------
-        # $summary active
-        # -------------------------------------------------
-        if len(parts) == 2 and parts[1].lower() == "active":
-            fetched = await safe_fetch_history(message.channel, 1000)
-            names = [a for (a, c, ts) in fetched]
-            counts = Counter(names).most_common(10)
-
-            if not counts:
-                await message.author.send("No activity found.")
-                return
-
-            lines = [f"**{name}** — {count} messages" for name, count in counts]
-            summary = "\n".join(lines)
-
-            embed = discord.Embed(
-                title=f"Most Active Users in #{channel_name}",
-                description=summary,
-                color=discord.Color.blue()
-            )
-
-            try:
-                await message.author.send(embed=embed)
-            except discord.Forbidden:
-                pass
-
-            return
-
-        # -------------------------------------------------
-        # $summary topics
-        # -------------------------------------------------
-        if len(parts) == 2 and parts[1].lower() == "topics":
-            fetched = await safe_fetch_history(message.channel, 500)
-            text_block = "\n".join([c for (a, c, ts) in fetched])
-            topics = await summarise_topics(text_block)
-
-            embed = discord.Embed(
-                title=f"Topic Analysis of #{channel_name}",
-                description=topics,
-                color=discord.Color.blue()
-            )
-
-            try:
-                await message.author.send(embed=embed)
-            except discord.Forbidden:
-                pass
-
-            return
-
-        # -------------------------------------------------
-        # Invalid usage
-        # -------------------------------------------------
-        await message.channel.send(
-            "Usage:\n"
-            "`$summary <number>`\n"
-            "`$summary daily`\n"
-            "`$summary weekly`\n"
-            "`$summary monthly`\n"
-            "`$summary keyword <word>`\n"
-            "`$summary user <nickname>`\n"
-            "`$summary active`\n"
-            "`$summary topics`"
-        )
-        return
-
-    # -----------------------------------------------------
-    # DARKNET MODERATION LOGIC
-    # -----------------------------------------------------
-    @bot.event
-    async def on_message(message):
-        # Let the bot process commands too, if you use commands extension
-        await bot.process_commands(message)
-
-        # -------------------------------------------------
-        # DARKNET MODERATION LOGIC
-        # -------------------------------------------------
-        if message.channel.id == DARKNET_CHANNEL_ID:
-            print("DEBUG: Darknet block reached")
-            print("DEBUG: Raw message:", message.content)
-
-            # Only evaluate messages from the target user
-            if message.author.name.lower() != TARGET_USERNAME:
-                return
-
-            # Ignore these names entirely (content-based ignore, optional)
-            if "Macer" in message.content or "Peacehammer" in message.content:
-                print("DEBUG: Ignored due to Macer/Peacehammer")
-                return
-
-            # Extract cleaned text for Gemini
-            text_to_check = extract_message_text(message)
-            print("DEBUG: Text to check:", text_to_check)
-
-            # No allowlists here: every Darknet message is analyzed
-            analysis = await analyse_message_moderation(text_to_check)
-
-            # Handle the analysis result as you already do
-            # e.g., log, post embed, etc.
-            await handle_darknet_analysis(message, text_to_check, analysis)
-
-        # Build embed
-        if analysis.get("violation"):
-            embed = discord.Embed(
-                title="Violation Detected",
-                description=analysis.get("short_summary", "No summary provided."),
-                color=discord.Color.red()
-            )
-        else:
-            embed = discord.Embed(
-                title="No Violation Detected",
-                description=analysis.get("short_summary", "Message appears compliant."),
-                color=discord.Color.green()
-            )
-
-        embed.add_field(name="Rule", value=analysis.get("rule", "None"), inline=False)
-        embed.add_field(name="Reason", value=analysis.get("reason", "None"), inline=False)
-        embed.add_field(name="Recommended Action", value=analysis.get("recommended_action", "None"), inline=False)
-        embed.add_field(name="Confidence", value=f"{analysis.get('confidence', 0.0):.2f}", inline=False)
-
-        try:
-            # Ping mod role only if violation
-            if analysis.get("violation"):
-                role = message.guild.get_role(MOD_ROLE_ID)
-                allowed = discord.AllowedMentions(roles=True)
-
-                await message.channel.send(
-                    content=role.mention,
-                    allowed_mentions=allowed
-                )
-
-                await message.channel.send(embed=embed)
-
-            else:
-                await message.channel.send(embed=embed)
-
-        except discord.Forbidden:
-            print("Bot lacks permission to send embeds or mentions.")
-
-# ---------------------------------------------------------
-# Run bot
-# ---------------------------------------------------------
-client.run(DISCORD_TOKEN)
\ No newline at end of file
+"""
+bot.py — Nyx Discord Bot
+------------------------
+
+Modules included:
+- External file loaders (wisdom.txt; rules and guidance live in moderation.py),
+  hot-reloaded on change by config_watcher.py
+- Darknet moderation system (Gemini-based, micro-batched via moderation.py);
+  during Gemini outages verdicts are deferred and posted once re-evaluated
+- Outbound dispatcher for verdict posts: one message per violation, clean
+  verdicts rolled into a periodic digest, paced per channel (outbound.py)
+- Summary system ($summary) with DM support
+- Wisdom system ($wisdom) with random quotes
+- Message caching for summaries (ring buffers, served from memory when they cover the window)
+- Persistent SQLite message store with incremental history sync (message_store.py)
+- Full-text keyword search over stored history (SQLite FTS5)
+- Topic analysis and summarization via Gemini (summaries.py)
+- Hierarchical daily/weekly/monthly summaries from persisted hourly/daily buckets
+- Summary result cache: repeat requests with no new messages are answered instantly
+- Identical concurrent $summary requests share one fetch and one model call
+- Live sliding-window author counters for $summary active (activity.py)
+- Recruit interviews persisted and resumed after a restart (recruit_store.py)
+- Prometheus metrics endpoint with per-stage latency histograms (metrics.py)
+- Clean structure for maintainability
+
+This file is generated as a complete, unified bot script.
+"""
+
+import os
+import random
+import discord
+from discord.ext import commands
+from dotenv import load_dotenv
+from datetime import datetime, timedelta, timezone
+import asyncio
+import re
+from recruit import handle_recruit_message, resume_sessions
+from message_cache import MessageRingBuffer
+from activity import ActivityTracker, ACTIVITY_WINDOWS, DEFAULT_ACTIVITY_WINDOW
+from message_store import MessageStore, sync_channel, ensure_count, go_live
+from moderation import moderate_message_text
+from config_watcher import config_watcher
+from metrics import registry, stage_timer, cache_lookup, start_metrics_server
+from outbound import moderation_posts, digest_line
+from summaries import (
+    summarize_messages, summarise_topics, summarize_window, rollup_window, current_bucket_start,
+    SummaryResultCache, SingleFlight, SUMMARY_ERROR, TOPICS_ERROR
+)
+
+# Load environment variables
+load_dotenv()
+DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
+
+# Discord intents
+intents = discord.Intents.default()
+intents.message_content = True
+
+bot = commands.Bot(command_prefix="!", intents=intents)
+
+# Channel + role settings
+DARKNET_CHANNEL_ID = 1327958045099294730
+TARGET_USERNAME = "nadyap"
+MOD_ROLE_ID = 1387473445536661585
+
+# Rolling caches (ring buffers, see message_cache.py for limits)
+generals_cache = MessageRingBuffer()
+officer_cache = MessageRingBuffer()
+
+# Persistent history (SQLite), kept live for the summary channels
+SUMMARY_CHANNEL_IDS = (1417799716275621989, 545294570091446280)
+message_store = MessageStore()
+
+# Per-author message counts over 1h/24h/7d, kept current by on_message
+activity = ActivityTracker()
+
+rollup_task: asyncio.Task | None = None
+
+# Finished $summary responses, keyed on channel + arguments + newest message
+summary_results = SummaryResultCache()
+summary_flights = SingleFlight()
+
+registry.gauge("nyx_summary_in_flight", "Distinct $summary requests being built.", callback=lambda: summary_flights.in_flight())
+
+# Most keyword matches passed on to the summarizer
+KEYWORD_MATCH_LIMIT = 500
+
+SUMMARY_INCOMPLETE_NOTE = "Some messages could not be fetched or summarized; this summary may be incomplete."
+
+def extract_message_text(message):
+    """
+    Extracts the AO relay text for Darknet moderation.
+    Keeps the channel tag ([WTB], [WTS], [General], etc.)
+    but strips the trailing [Name] [Ignore] pair.
+    """
+    text = message.content
+
+    # Strip trailing [Name] [Ignore], but keep everything before it
+    # Examples:
+    #   "[WTB] beast armor ... [Madasadoc] [Ignore]"
+    #   "[General] who wants some tower fields? [Jjjee940] [Ignore]"
+    text = re.sub(
+        r"\s*\[[A-Za-z0-9_-]{3,20}\]\s*\[Ignore\]\s*$",
+        "",
+        text,
+    ).strip()
+
+    return text
+
+
+# ---------------------------------------------------------
+# Load external files
+# ---------------------------------------------------------
+def load_wisdom_quotes():
+    try:
+        with open("wisdom.txt", "r", encoding="utf-8") as f:
+            lines = [line.strip() for line in f.readlines() if line.strip()]
+            return lines
+    except FileNotFoundError:
+        return []
+
+WISDOM_QUOTES = load_wisdom_quotes()
+
+def reload_wisdom_quotes():
+    global WISDOM_QUOTES
+    WISDOM_QUOTES = load_wisdom_quotes()
+
+config_watcher.watch(("wisdom.txt",), reload_wisdom_quotes)
+
+# ---------------------------------------------------------
+# Extract text from message + embeds
+# ---------------------------------------------------------
+def extract_message_text(message: discord.Message) -> str:
+    parts = []
+
+    if message.content:
+        parts.append(message.content)
+
+    for embed in message.embeds:
+        if embed.title:
+            parts.append(embed.title)
+        if embed.description:
+            parts.append(embed.description)
+        for field in embed.fields:
+            parts.append(f"{field.name}: {field.value}")
+        if embed.footer and embed.footer.text:
+            parts.append(embed.footer.text)
+
+    text = "\n".join(parts).strip()
+
+    # Remove trailing [Name] [Ignore] but keep everything else
+    text = re.sub(
+        r"\s*\[[A-Za-z0-9_-]{3,20}\]\s*\[Ignore\]\s*$",
+        "",
+        text,
+    ).strip()
+
+    return text
+# ---------------------------------------------------------
+# History access (local store; Discord API only for catch-up)
+# ---------------------------------------------------------
+async def fetch_recent(channel: discord.TextChannel, limit: int) -> tuple[list[tuple[str, str, datetime]], bool]:
+    # Also returns whether Discord history could be fully fetched
+    complete = await ensure_count(message_store, channel, limit)
+    return message_store.last(channel.id, limit), complete
+
+# ---------------------------------------------------------
+# Cache handler
+# ---------------------------------------------------------
+def get_cache(channel_id: int) -> MessageRingBuffer | None:
+    if channel_id == 1417799716275621989:
+        return generals_cache
+    if channel_id == 545294570091446280:
+        return officer_cache
+    return None
+
+def add_to_cache(channel_id: int, author: str, content: str, timestamp: datetime):
+    cache = get_cache(channel_id)
+    if cache is not None:
+        cache.append(author, content, timestamp)
+
+def parse_window(token: str) -> timedelta | None:
+    # "24h", "7d", "4w" -> timedelta
+    match = re.fullmatch(r"(\d+)([hdw])", token.lower())
+    if not match:
+        return None
+    amount, unit = int(match.group(1)), match.group(2)
+    return {"h": timedelta(hours=amount), "d": timedelta(days=amount), "w": timedelta(weeks=amount)}[unit]
+
+async def fetch_window(channel: discord.TextChannel, cutoff: datetime, limit: int) -> tuple[list[tuple[str, str, datetime]], bool]:
+    # Serve from memory when the cache holds everything since the cutoff,
+    # otherwise from the local store after an incremental sync
+    cache = get_cache(channel.id)
+    if cache is not None:
+        cache_lookup("message_ring", cache.covers(cutoff))
+    if cache is not None and cache.covers(cutoff):
+        return cache.since(cutoff), True
+
+    complete = await sync_channel(message_store, channel, cutoff)
+    return message_store.since(channel.id, cutoff)[-limit:], complete
+
+# ---------------------------------------------------------
+# Window summaries (daily / weekly / monthly)
+# ---------------------------------------------------------
+async def summarize_channel_window(channel: discord.TextChannel, cutoff: datetime) -> tuple[str | None, bool]:
+    complete = await sync_channel(message_store, channel, cutoff)
+    if not message_store.count_since(channel.id, cutoff):
+        return None, complete
+
+    # Closed hours/days come from the summary tree; only the open hour is raw
+    recent, recent_complete = await fetch_window(channel, current_bucket_start(), 5000)
+    summary, summarized = await summarize_window(message_store, channel.id, cutoff, recent)
+    return summary, complete and recent_complete and summarized
+
+async def summary_rollup_loop():
+    # Summarize each hour of the summary channels shortly after it closes
+    while True:
+        now = datetime.now(timezone.utc)
+        for channel_id in SUMMARY_CHANNEL_IDS:
+            try:
+                await rollup_window(message_store, channel_id, now - timedelta(hours=24))
+            except Exception as e:
+                print(f"DEBUG: Summary rollup failed for {channel_id}: {e}")
+
+        next_hour = current_bucket_start() + timedelta(hours=1, minutes=1)
+        await asyncio.sleep(max(60.0, (next_hour - datetime.now(timezone.utc)).total_seconds()))
+
+# ---------------------------------------------------------
+# $summary subcommands
+# ---------------------------------------------------------
+async def build_summary_response(channel: discord.TextChannel, parts: list[str]) -> tuple[discord.Embed | str | None, bool]:
+    """
+    Runs one $summary subcommand. Returns the embed to DM, a plain
+    "nothing found" message, or None for invalid usage, together with
+    whether it is complete (Discord history fully fetched and every
+    period of a window summarized).
+    """
+    channel_name = channel.name
+
+    # Determine which cache to use (None for uncached channels)
+    cache = get_cache(channel.id)
+
+    # -------------------------------------------------
+    # $summary <number>
+    # -------------------------------------------------
+    if len(parts) == 2 and parts[1].isdigit():
+        count = int(parts[1])
+
+        if cache is not None and cache.covers_last(count):
+            history, complete = cache.last(count), True
+        else:
+            history, complete = await fetch_recent(channel, count)
+
+        summary = await summarize_messages(history)
+
+        embed = discord.Embed(
+            title=f"Summary of #{channel_name} — Last {count} Messages",
+            description=summary,
+            color=discord.Color.blue()
+        )
+
+        return embed, complete
+
+    # -------------------------------------------------
+    # $summary daily
+    # -------------------------------------------------
+    if len(parts) == 2 and parts[1].lower() == "daily":
+        cutoff = datetime.now(timezone.utc) - timedelta(hours=24)
+        summary, complete = await summarize_channel_window(channel, cutoff)
+
+        if summary is None:
+            return "No messages found in the last 24 hours.", complete
+
+        embed = discord.Embed(
+            title=f"Daily Summary of #{channel_name}",
+            description=summary,
+            color=discord.Color.blue()
+        )
+
+        return embed, complete
+
+    # -------------------------------------------------
+    # $summary weekly
+    # -------------------------------------------------
+    if len(parts) == 2 and parts[1].lower() == "weekly":
+        cutoff = datetime.now(timezone.utc) - timedelta(days=7)
+        summary, complete = await summarize_channel_window(channel, cutoff)
+
+        if summary is None:
+            return "No messages found in the last 7 days.", complete
+
+        embed = discord.Embed(
+            title=f"Weekly Summary of #{channel_name}",
+            description=summary,
+            color=discord.Color.blue()
+        )
+
+        return embed, complete
+
+    # -------------------------------------------------
+    # $summary monthly
+    # -------------------------------------------------
+    if len(parts) == 2 and parts[1].lower() == "monthly":
+        cutoff = datetime.now(timezone.utc) - timedelta(days=30)
+        summary, complete = await summarize_channel_window(channel, cutoff)
+
+        if summary is None:
+            return "No messages found in the last 30 days.", complete
+
+        embed = discord.Embed(
+            title=f"Monthly Summary of #{channel_name}",
+            description=summary,
+            color=discord.Color.blue()
+        )
+
+        return embed, complete
+
+    # -------------------------------------------------
+    # $summary keyword <query> [window]
+    #   query: words (all must match), "exact phrase", prefix*
+    #   window: optional, e.g. 24h, 7d, 4w
+    # -------------------------------------------------
+    if len(parts) >= 3 and parts[1].lower() == "keyword":
+        query_parts = parts[2:]
+        window = parse_window(query_parts[-1]) if len(query_parts) > 1 else None
+        since = None
+        if window:
+            since = datetime.now(timezone.utc) - window
+            query_parts = query_parts[:-1]
+        keyword = " ".join(query_parts).lower()
+
+        complete = await sync_channel(message_store, channel, since)
+        history = message_store.search(channel.id, keyword, since, KEYWORD_MATCH_LIMIT)
+
+        if not history:
+            return f"No messages found containing '{keyword}'.", complete
+
+        summary = await summarize_messages(history)
+
+        embed = discord.Embed(
+            title=f"Keyword Summary of #{channel_name}: {keyword}",
+            description=summary,
+            color=discord.Color.blue()
+        )
+
+        return embed, complete
+
+    # -------------------------------------------------
+    # $summary user <nickname>
+    # -------------------------------------------------
+    if len(parts) == 3 and parts[1].lower() == "user":
+        target = parts[2].lower()
+        complete = await ensure_count(message_store, channel, 2000)
+        history = message_store.by_author(channel.id, target, 2000)
+
+        if not history:
+            return f"No messages found from user '{target}'.", complete
+
+        summary = await summarize_messages(history)
+
+        embed = discord.Embed(
+            title=f"User Summary of #{channel_name}: {target}",
+            description=summary,
+            color=discord.Color.blue()
+        )
+
+        return embed, complete
+
+    # -------------------------------------------------
+    # $summary active [1h|24h|7d]
+    # -------------------------------------------------
+    if len(parts) in (2, 3) and parts[1].lower() == "active":
+        window = parts[2].lower() if len(parts) == 3 else DEFAULT_ACTIVITY_WINDOW
+        if window not in ACTIVITY_WINDOWS:
+            return None, True
+
+        complete = True
+        if activity.is_tracking(channel.id):
+            counts = activity.top(channel.id, window, 10)
+        else:
+            # Channels without live counters: count stored history instead
+            complete = await ensure_count(message_store, channel, 1000)
+            counts = message_store.author_counts(channel.id, 1000, 10)
+            window = "last 1000 messages"
+
+        if not counts:
+            return "No activity found.", complete
+
+        lines = [f"**{name}** — {count} messages" for name, count in counts]
+        summary = "\n".join(lines)
+
+        embed = discord.Embed(
+            title=f"Most Active Users in #{channel_name} ({window})",
+            description=summary,
+            color=discord.Color.blue()
+        )
+
+        return embed, complete
+
+    # -------------------------------------------------
+    # $summary topics
+    # -------------------------------------------------
+    if len(parts) == 2 and parts[1].lower() == "topics":
+        fetched, complete = await fetch_recent(channel, 500)
+        text_block = "\n".join([c for (a, c, ts) in fetched])
+        topics = await summarise_topics(text_block)
+
+        embed = discord.Embed(
+            title=f"Topic Analysis of #{channel_name}",
+            description=topics,
+            color=discord.Color.blue()
+        )
+
+        return embed, complete
+
+    # -------------------------------------------------
+    # Invalid usage
+    # -------------------------------------------------
+    return None, True
+
+async def resolve_summary_response(channel: discord.TextChannel, parts: list[str]) -> discord.Embed | str | None:
+    # Reuse the last response if nothing new was posted since
+    synced = await sync_channel(message_store, channel)
+    key = (channel.id, tuple(p.lower() for p in parts[1:]), message_store.newest_id(channel.id))
+
+    response = summary_results.get(key)
+    cache_lookup("summary_result", response is not None)
+    if response is not None:
+        print("DEBUG: Summary result cache hit", summary_results.stats())
+        return response
+
+    response, complete = await build_summary_response(channel, parts)
+
+    # Never pass off (or cache) a summary of partly fetched or summarized history as complete
+    if not (synced and complete):
+        if isinstance(response, discord.Embed):
+            response.set_footer(text=SUMMARY_INCOMPLETE_NOTE)
+        return response
+
+    if response is not None and not (
+        isinstance(response, discord.Embed) and response.description in (SUMMARY_ERROR, TOPICS_ERROR)
+    ):
+        summary_results.put(key, response)
+    return response
+
+# ---------------------------------------------------------
+# Darknet moderation handler
+# ---------------------------------------------------------
+async def handle_darknet_message(message: discord.Message):
+    print("DEBUG: Darknet block reached")
+    print("DEBUG: Raw message:", message.content)
+
+    # Only evaluate messages from the target user
+    if message.author.name.lower() != TARGET_USERNAME:
+        return
+
+    # Ignore these names entirely (content-based ignore, optional)
+    if "Macer" in message.content or "Peacehammer" in message.content:
+        print("DEBUG: Ignored due to Macer/Peacehammer")
+        return
+
+    # Extract cleaned text for Gemini
+    text_to_check = extract_message_text(message)
+    print("DEBUG: Text to check:", text_to_check)
+
+    # No allowlists here: every Darknet message is analyzed.
+    # Repeats are answered from the verdict cache; the rest are batched.
+    # If Gemini is down the message is queued, and posted once re-evaluated
+    async def on_reevaluated(analysis: dict):
+        await handle_darknet_analysis(message, text_to_check, analysis)
+
+    analysis = await moderate_message_text(text_to_check, on_reevaluated=on_reevaluated)
+    if analysis.get("deferred"):
+        print("DEBUG: Darknet verdict deferred until Gemini recovers")
+        return
+
+    await handle_darknet_analysis(message, text_to_check, analysis)
+
+async def handle_darknet_analysis(message: discord.Message, text_to_check: str, analysis: dict):
+    # Clean verdicts are collected into the rolling digest (outbound.py)
+    if not analysis.get("violation") and not analysis.get("needs_review"):
+        moderation_posts.add_clean(message.channel, digest_line(text_to_check, analysis))
+        return
+
+    # Build embed
+    if analysis.get("needs_review"):
+        embed = discord.Embed(
+            title="Needs Manual Review",
+            description=f"{analysis.get('short_summary', 'Not moderated.')}\n\n> {text_to_check[:1000]}",
+            color=discord.Color.orange()
+        )
+    else:
+        embed = discord.Embed(
+            title="Violation Detected",
+            description=analysis.get("short_summary", "No summary provided."),
+            color=discord.Color.red()
+        )
+
+    embed.add_field(name="Rule", value=analysis.get("rule", "None"), inline=False)
+    embed.add_field(name="Reason", value=analysis.get("reason", "None"), inline=False)
+    embed.add_field(name="Recommended Action", value=analysis.get("recommended_action", "None"), inline=False)
+    embed.add_field(name="Confidence", value=f"{analysis.get('confidence', 0.0):.2f}", inline=False)
+    if analysis.get("reevaluated"):
+        embed.set_footer(text="Re-evaluated after a Gemini outage")
+
+    try:
+        # Mod role ping and embed go out as one message, ahead of any digest
+        role = message.guild.get_role(MOD_ROLE_ID)
+        await moderation_posts.post_alert(message.channel, embed, mention=role.mention)
+
+    except discord.Forbidden:
+        print("Bot lacks permission to send embeds or mentions.")
+    except discord.HTTPException as e:
+        print(f"DEBUG: Moderation alert not sent: {e}")
+
+# ---------------------------------------------------------
+# Discord events
+# ---------------------------------------------------------
+async def sync_summary_channels():
+    for channel_id in SUMMARY_CHANNEL_IDS:
+        channel = bot.get_channel(channel_id)
+        if channel is None:
+            continue
+        try:
+            await go_live(message_store, channel)
+        except discord.HTTPException as e:
+            print(f"DEBUG: History sync failed for #{channel}: {e}")
+
+        # Rebuild activity counters from the store (local query, no API)
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=activity.longest_window_seconds())
+        activity.seed(channel_id, message_store.since(channel_id, cutoff))
+
+@bot.event
+async def on_ready():
+    print(f"Logged in as {bot.user}")
+    print("Bot connected and ready")
+    # A new gateway session does not replay what was posted while offline
+    generals_cache.mark_gap()
+    officer_cache.mark_gap()
+    config_watcher.start()
+    await start_metrics_server()
+    await resume_sessions(bot)
+    await sync_summary_channels()
+
+    global rollup_task
+    if rollup_task is None:
+        rollup_task = asyncio.create_task(summary_rollup_loop())
+
+@bot.event
+async def on_disconnect():
+    # Events may be missed while disconnected; catch up again on resume
+    message_store.mark_all_offline()
+    generals_cache.mark_gap()
+    officer_cache.mark_gap()
+
+@bot.event
+async def on_resumed():
+    await sync_summary_channels()
+
+@bot.event
+async def on_message(message: discord.Message):
+    # Any post (ours included) buries the clean verdict digest in that channel
+    moderation_posts.note_message(message)
+
+    if message.author == bot.user:
+        return
+    # -----------------------------------
+    # RECRUITMENT SYSTEM HOOK (ADD THIS)
+    # -----------------------------------
+    handled = await handle_recruit_message(bot, message)
+    if handled:
+        return
+    # Cache messages for summary commands
+    if message.channel.id == 1417799716275621989:
+        add_to_cache(1417799716275621989, message.author.display_name, message.content, message.created_at)
+
+    if message.channel.id == 545294570091446280:
+        add_to_cache(545294570091446280, message.author.display_name, message.content, message.created_at)
+
+    if message.channel.id in SUMMARY_CHANNEL_IDS:
+        message_store.record(message)
+        activity.record(message.channel.id, message.author.display_name, message.created_at)
+
+    # -----------------------------------------------------
+    # $wisdom command (global)
+    # -----------------------------------------------------
+    if message.content.strip().lower() == "$wisdom":
+        if not WISDOM_QUOTES:
+            await message.channel.send("No wisdom available.")
+            return
+
+        quote = random.choice(WISDOM_QUOTES)
+
+        embed = discord.Embed(
+            title="A word of wisdom",
+            description=quote,
+            color=discord.Color.from_rgb(255, 255, 255)
+        )
+
+        await message.channel.send(embed=embed)
+        return
+
+    # -----------------------------------------------------
+    # SUMMARY COMMANDS (GLOBAL + ROLE-LOCKED)
+    # -----------------------------------------------------
+    if message.content.startswith("$summary"):
+
+        allowed_roles = ["officer", "general"]
+        user_roles = [role.name.lower() for role in message.author.roles]
+
+        if not any(role in allowed_roles for role in user_roles):
+            await message.channel.send("You don’t have permission to use this command.")
+            return
+
+        parts = message.content.split()
+
+        # Identical requests already running share that result
+        flight_key = (message.channel.id, tuple(p.lower() for p in parts[1:]))
+        response = await summary_flights.run(
+            flight_key,
+            lambda: resolve_summary_response(message.channel, parts)
+        )
+
+        # -------------------------------------------------
+        # Invalid usage
+        # -------------------------------------------------
+        if response is None:
+            await message.channel.send(
+                "Usage:\n"
+                "`$summary <number>`\n"
+                "`$summary daily`\n"
+                "`$summary weekly`\n"
+                "`$summary monthly`\n"
+                "`$summary keyword <words | \"phrase\" | prefix*> [24h|7d|4w]`\n"
+                "`$summary user <nickname>`\n"
+                "`$summary active [1h|24h|7d]`\n"
+                "`$summary topics`"
+            )
+            return
+
+        try:
+            with stage_timer("discord_send", "summary"):
+                if isinstance(response, discord.Embed):
+                    await message.author.send(embed=response)
+                else:
+                    await message.author.send(response)
+        except discord.Forbidden:
+            pass
+
+        return
+
+    # -----------------------------------------------------
+    # DARKNET MODERATION LOGIC
+    # -----------------------------------------------------
+    if message.channel.id == DARKNET_CHANNEL_ID:
+        await handle_darknet_message(message)
+
+# ---------------------------------------------------------
+# Run bot
+# ---------------------------------------------------------
+if __name__ == "__main__":
+    bot.run(DISCORD_TOKEN)
\ No newline at end of file
@@ -0,0 +1,68 @@
+"""
+config_watcher.py — Hot reload of text config files
+---------------------------------------------------
+
+ConfigWatcher polls the mtime/size of registered files (rules.txt,
+moderationguide.txt, wisdom.txt, ...) and calls the owner's reload
+callback once per detected change, so edits apply without a restart.
+
+Owners register with watch(paths, callback) at import time; bot.py starts
+the polling task once the event loop is running. Callbacks are expected
+to build their new state completely and then swap it in with a single
+assignment, so readers never see a half-reloaded config.
+"""
+
+import asyncio
+import os
+
+CONFIG_POLL_SECONDS = 5.0
+
+
+def file_signature(paths: tuple[str, ...]) -> tuple:
+    signature = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            signature.append((path, st.st_mtime_ns, st.st_size))
+        except OSError:
+            signature.append((path, None, None))
+    return tuple(signature)
+
+
+class ConfigWatcher:
+    def __init__(self, interval: float = CONFIG_POLL_SECONDS):
+        self.interval = interval
+        self._watches: list[list] = []  # [paths, callback, last signature]
+        self._task: asyncio.Task | None = None
+
+    def watch(self, paths: tuple[str, ...], callback):
+        self._watches.append([paths, callback, file_signature(paths)])
+
+    def check(self) -> int:
+        """Reloads every watch whose files changed; returns how many did."""
+        reloaded = 0
+        for watch in self._watches:
+            paths, callback, last = watch
+            signature = file_signature(paths)
+            if signature == last:
+                continue
+            watch[2] = signature
+            print(f"DEBUG: Config changed, reloading {', '.join(paths)}")
+            try:
+                callback()
+                reloaded += 1
+            except Exception as e:
+                print(f"DEBUG: Reload of {', '.join(paths)} failed: {e}")
+        return reloaded
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self.check()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+
+config_watcher = ConfigWatcher()
@@ -0,0 +1,304 @@
+"""
+llm.py — Shared LLM access for Nyx
+----------------------------------
+
+Every LLM call in the bot (moderation.py, summaries.py, recruit.py) goes
+through generate_content() here, which forwards to one process-wide
+provider:
+
+- GeminiProvider: a single google-genai client (and so one connection
+  pool) using the SDK's async API, so a slow round-trip never blocks the
+  Discord event loop
+- FakeProvider: deterministic in-process stand-in with configurable
+  latency and failure injection, for offline runs, load tests and
+  benchmarks without API keys
+
+Requests are admitted by the LLMScheduler (llm_scheduler.py): strict
+priority moderation > recruit > summary, RPM/TPM token buckets, a global
+and per-class in-flight cap, and queue-time metrics (scheduler_stats()),
+also exported as gauges through metrics.py.
+
+Settings (.env):
+- LLM_PROVIDER            gemini (default) or fake
+- LLM_MAX_IN_FLIGHT       concurrent request limit (default 4)
+- LLM_RPM / LLM_TPM       requests / input tokens per minute (0 = no limit)
+- LLM_MODEL_MODERATION / LLM_MODEL_SUMMARY / LLM_MODEL_RECRUIT
+- LLM_MODEL_MODERATION_FALLBACK  cheaper model for hedged moderation calls
+- LLM_FAKE_LATENCY_MS, LLM_FAKE_JITTER_MS, LLM_FAKE_FAILURE_RATE,
+  LLM_FAKE_SEED           FakeProvider behaviour
+
+create_cached_content() / delete_cached_content() manage Gemini context
+caches for large prompt preambles that repeat on every call.
+"""
+
+import os
+import re
+import json
+import random
+import asyncio
+from dotenv import load_dotenv
+from llm_scheduler import LLMScheduler, PRIORITY_ORDER
+from metrics import registry, stage_timer, llm_requests, llm_errors
+
+load_dotenv()
+
+# Maximum number of concurrent LLM requests across the whole bot
+LLM_MAX_IN_FLIGHT = max(1, int(os.getenv("LLM_MAX_IN_FLIGHT", "4")))
+
+# Quota of the API key
+LLM_RPM = float(os.getenv("LLM_RPM", "1000"))
+LLM_TPM = float(os.getenv("LLM_TPM", "1000000"))
+
+# Per-class in-flight caps, and slots only moderation may use
+LLM_CLASS_LIMITS = {"moderation": LLM_MAX_IN_FLIGHT, "recruit": 2, "summary": 2}
+LLM_RESERVED_FOR_MODERATION = 1
+
+# Rough input size estimate for the TPM bucket
+CHARS_PER_TOKEN = 4
+
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini").lower()
+
+# Model per call site
+MODELS = {
+    "moderation": os.getenv("LLM_MODEL_MODERATION", "models/gemini-2.5-flash"),
+    "moderation_fallback": os.getenv("LLM_MODEL_MODERATION_FALLBACK", "models/gemini-2.5-flash-lite"),
+    "summary": os.getenv("LLM_MODEL_SUMMARY", "models/gemini-2.5-flash"),
+    "recruit": os.getenv("LLM_MODEL_RECRUIT", "gemini-2.0-flash"),
+}
+
+# Words the fake backend treats as rule violations in moderation prompts
+FAKE_VIOLATION_WORDS = ("aosharp", "exploit", "scam", "crash the server")
+
+
+# ---------------------------------------------------------
+# Providers
+# ---------------------------------------------------------
+class LLMProvider:
+    """
+    Interface every backend implements. Responses expose `.text`;
+    cache objects expose `.name`.
+    """
+
+    name = "base"
+
+    async def generate(self, model: str, contents, config: dict | None = None):
+        raise NotImplementedError
+
+    async def create_cache(self, model: str, config: dict):
+        raise NotImplementedError
+
+    async def delete_cache(self, name: str):
+        raise NotImplementedError
+
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+
+    def __init__(self, api_key: str | None = None):
+        from google import genai
+        self.client = genai.Client(api_key=api_key or os.getenv("GEMINI_API_KEY"))
+
+    async def generate(self, model: str, contents, config: dict | None = None):
+        kwargs = {"config": config} if config else {}
+        return await self.client.aio.models.generate_content(model=model, contents=contents, **kwargs)
+
+    async def create_cache(self, model: str, config: dict):
+        return await self.client.aio.caches.create(model=model, config=config)
+
+    async def delete_cache(self, name: str):
+        await self.client.aio.caches.delete(name=name)
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeCache:
+    def __init__(self, name: str):
+        self.name = name
+
+
+class FakeProviderError(Exception):
+    pass
+
+
+class FakeProvider(LLMProvider):
+    """
+    Answers locally after a simulated delay. Moderation prompts get
+    well-formed verdict JSON (single or batch), everything else a short
+    canned text. Same seed + same calls = same latencies and failures.
+    """
+
+    name = "fake"
+
+    def __init__(self, latency_ms: float = 300.0, jitter_ms: float = 100.0,
+                 failure_rate: float = 0.0, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._caches: dict[str, str] = {}
+        self.calls = 0
+        self.failures = 0
+
+    async def _delay(self):
+        delay = self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)
+        await asyncio.sleep(max(0.0, delay) / 1000)
+
+    def _should_fail(self) -> bool:
+        return self._random.random() < self.failure_rate
+
+    async def generate(self, model: str, contents, config: dict | None = None):
+        self.calls += 1
+        fail = self._should_fail()
+        await self._delay()
+        if fail:
+            self.failures += 1
+            raise FakeProviderError("Injected failure")
+
+        cached = (config or {}).get("cached_content")
+        if cached is not None and cached not in self._caches:
+            raise FakeProviderError(f"Cached content {cached} not found")
+
+        return FakeResponse(fake_reply(_contents_text(contents)))
+
+    async def create_cache(self, model: str, config: dict):
+        await self._delay()
+        name = f"cachedContents/fake-{len(self._caches) + 1}"
+        self._caches[name] = config.get("system_instruction", "")
+        return FakeCache(name)
+
+    async def delete_cache(self, name: str):
+        self._caches.pop(name, None)
+
+
+def _contents_text(contents) -> str:
+    if isinstance(contents, str):
+        return contents
+    parts = []
+    for item in contents:
+        for part in item.get("parts", []):
+            parts.append(part.get("text", ""))
+    return "\n".join(parts)
+
+
+def _fake_verdict(message_text: str) -> dict:
+    lower = message_text.lower()
+    violation = any(word in lower for word in FAKE_VIOLATION_WORDS)
+    return {
+        "violation": violation,
+        "rule": "7" if violation else "",
+        "reason": "Fake backend keyword match." if violation else "Fake backend: nothing found.",
+        "recommended_action": "Warning" if violation else "No Action",
+        "short_summary": "Fake verdict.",
+        "confidence": 0.9 if violation else 0.6
+    }
+
+
+def fake_reply(prompt: str) -> str:
+    if "Messages:\n" in prompt:
+        numbered = prompt.split("Messages:\n", 1)[-1]
+        verdicts = []
+        for line in numbered.splitlines():
+            match = re.match(r"(\d+)\. (.*)", line)
+            if match:
+                verdicts.append(dict(_fake_verdict(match.group(2)), id=int(match.group(1))))
+        return json.dumps(verdicts)
+
+    if "Message:\n" in prompt:
+        return json.dumps(_fake_verdict(prompt.split("Message:\n", 1)[-1]))
+
+    words = prompt.split()
+    return f"(fake) {len(words)} words in, nothing notable happened."
+
+
+def build_provider(name: str = LLM_PROVIDER) -> LLMProvider:
+    if name == "fake":
+        return FakeProvider(
+            latency_ms=float(os.getenv("LLM_FAKE_LATENCY_MS", "300")),
+            jitter_ms=float(os.getenv("LLM_FAKE_JITTER_MS", "100")),
+            failure_rate=float(os.getenv("LLM_FAKE_FAILURE_RATE", "0")),
+            seed=int(os.getenv("LLM_FAKE_SEED", "0"))
+        )
+    return GeminiProvider()
+
+
+_provider: LLMProvider | None = None
+
+
+def get_provider() -> LLMProvider:
+    # One provider (and client) per process, built on first use
+    global _provider
+    if _provider is None:
+        _provider = build_provider()
+        print(f"DEBUG: LLM provider: {_provider.name}")
+    return _provider
+
+
+def set_provider(provider: LLMProvider):
+    """Swaps the process-wide provider, e.g. for a FakeProvider in benchmarks."""
+    global _provider
+    _provider = provider
+
+
+# ---------------------------------------------------------
+# Call helpers
+# ---------------------------------------------------------
+scheduler = LLMScheduler(
+    max_in_flight=LLM_MAX_IN_FLIGHT,
+    class_limits=LLM_CLASS_LIMITS,
+    reserved_for_top=LLM_RESERVED_FOR_MODERATION,
+    requests_per_minute=LLM_RPM,
+    tokens_per_minute=LLM_TPM
+)
+
+
+def estimate_tokens(contents) -> int:
+    return len(_contents_text(contents)) // CHARS_PER_TOKEN + 1
+
+
+def scheduler_stats() -> dict:
+    return scheduler.stats()
+
+
+def _scheduler_gauge(field: str):
+    return lambda: {(priority,): scheduler.stats()[priority][field] for priority in PRIORITY_ORDER}
+
+
+registry.gauge("nyx_llm_queued", "LLM requests waiting for a scheduler slot.", ("priority",), _scheduler_gauge("queued"))
+registry.gauge("nyx_llm_in_flight", "LLM requests currently running.", ("priority",), _scheduler_gauge("in_flight"))
+registry.gauge(
+    "nyx_llm_queue_wait_p95_ms", "p95 time spent waiting for a scheduler slot.", ("priority",),
+    _scheduler_gauge("wait_p95_ms")
+)
+
+
+async def generate_content(model: str, contents, config: dict | None = None, priority: str = "summary"):
+    """
+    Waits for the scheduler to admit the request in its priority class
+    (moderation, recruit or summary), then runs it on the shared provider.
+    """
+    async with scheduler.slot(priority, estimate_tokens(contents)):
+        llm_requests.inc(priority=priority)
+        try:
+            with stage_timer("llm_call", priority):
+                return await get_provider().generate(model, contents, config)
+        except Exception:
+            llm_errors.inc(priority=priority)
+            raise
+
+
+async def create_cached_content(model: str, config: dict, priority: str = "summary"):
+    """Registers a reusable context (e.g. a system instruction) and returns the cache object."""
+    tokens = len(config.get("system_instruction", "")) // CHARS_PER_TOKEN + 1
+    async with scheduler.slot(priority, tokens):
+        return await get_provider().create_cache(model, config)
+
+
+async def delete_cached_content(name: str):
+    try:
+        await get_provider().delete_cache(name)
+    except Exception as e:
+        # Expired caches are removed by Gemini anyway
+        print(f"DEBUG: Could not delete cached content {name}: {e}")
@@ -0,0 +1,182 @@
+"""
+llm_scheduler.py — Priority scheduling and rate limiting for LLM calls
+----------------------------------------------------------------------
+
+All LLM traffic shares one API key, so every request in llm.py first
+takes a slot from the process-wide LLMScheduler:
+
+- priority classes, strictly ordered: moderation > recruit > summary;
+  a waiting higher class is always dispatched first
+- requests-per-minute and tokens-per-minute token buckets; when the
+  next request of the highest waiting class would exceed them, nothing
+  of a lower class is sent ahead of it
+- a global in-flight cap plus per-class caps, with slots held back so
+  bulk summary work can never occupy all of them ahead of moderation
+- queue-time metrics per class (count, mean, p95, max) via stats()
+"""
+
+import time
+import asyncio
+from collections import deque
+
+PRIORITY_ORDER = ("moderation", "recruit", "summary")
+
+# Recent queue times kept per class for the p95
+QUEUE_TIME_SAMPLES = 500
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        # per_minute <= 0 disables the bucket
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = float(per_minute)
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        if self.capacity <= 0:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        if self.capacity <= 0:
+            return
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+
+class LLMScheduler:
+    def __init__(self, max_in_flight: int, class_limits: dict[str, int], reserved_for_top: int,
+                 requests_per_minute: float, tokens_per_minute: float):
+        self.max_in_flight = max_in_flight
+        self.class_limits = class_limits
+        self.reserved_for_top = min(reserved_for_top, max_in_flight - 1)
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+
+        self._queues: dict[str, deque] = {name: deque() for name in PRIORITY_ORDER}
+        self._in_flight: dict[str, int] = {name: 0 for name in PRIORITY_ORDER}
+        self._timer: asyncio.TimerHandle | None = None
+
+        self._waits: dict[str, deque] = {name: deque(maxlen=QUEUE_TIME_SAMPLES) for name in PRIORITY_ORDER}
+        self._served: dict[str, int] = {name: 0 for name in PRIORITY_ORDER}
+        self._max_wait: dict[str, float] = {name: 0.0 for name in PRIORITY_ORDER}
+
+    # -----------------------------------------------------
+    # Slots
+    # -----------------------------------------------------
+    def slot(self, priority: str, tokens: int = 1):
+        return _Slot(self, priority, tokens)
+
+    async def acquire(self, priority: str, tokens: int = 1):
+        if priority not in self._queues:
+            priority = PRIORITY_ORDER[-1]
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (future, tokens, time.monotonic())
+        self._queues[priority].append(entry)
+        self._dispatch()
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release(priority)
+            else:
+                try:
+                    self._queues[priority].remove(entry)
+                except ValueError:
+                    pass
+            raise
+
+    def release(self, priority: str):
+        self._in_flight[priority] -= 1
+        self._dispatch()
+
+    def _has_room(self, priority: str) -> bool:
+        total = sum(self._in_flight.values())
+        if total >= self.max_in_flight:
+            return False
+        if self._in_flight[priority] >= self.class_limits.get(priority, self.max_in_flight):
+            return False
+        # Lower classes leave the reserved slots free for the top class
+        if priority != PRIORITY_ORDER[0] and total >= self.max_in_flight - self.reserved_for_top:
+            return False
+        return True
+
+    def _dispatch(self):
+        for priority in PRIORITY_ORDER:
+            queue = self._queues[priority]
+            while queue and self._has_room(priority):
+                future, tokens, enqueued = queue[0]
+                if future.done():
+                    queue.popleft()
+                    continue
+
+                wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+                if wait > 0:
+                    # Rate limited: lower classes must not jump ahead either
+                    self._schedule_retry(wait)
+                    return
+
+                queue.popleft()
+                self.requests.take(1)
+                self.tokens.take(tokens)
+                self._in_flight[priority] += 1
+                self._record_wait(priority, time.monotonic() - enqueued)
+                future.set_result(None)
+
+    def _schedule_retry(self, delay: float):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = asyncio.get_running_loop().call_later(delay, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+    # -----------------------------------------------------
+    # Metrics
+    # -----------------------------------------------------
+    def _record_wait(self, priority: str, seconds: float):
+        self._waits[priority].append(seconds)
+        self._served[priority] += 1
+        self._max_wait[priority] = max(self._max_wait[priority], seconds)
+
+    def stats(self) -> dict:
+        result = {}
+        for priority in PRIORITY_ORDER:
+            waits = sorted(self._waits[priority])
+            result[priority] = {
+                "served": self._served[priority],
+                "queued": len(self._queues[priority]),
+                "in_flight": self._in_flight[priority],
+                "wait_mean_ms": round(1000 * sum(waits) / len(waits), 1) if waits else 0.0,
+                "wait_p95_ms": round(1000 * waits[int(0.95 * (len(waits) - 1))], 1) if waits else 0.0,
+                "wait_max_ms": round(1000 * self._max_wait[priority], 1)
+            }
+        return result
+
+
+class _Slot:
+    def __init__(self, scheduler: LLMScheduler, priority: str, tokens: int):
+        self.scheduler = scheduler
+        self.priority = priority if priority in PRIORITY_ORDER else PRIORITY_ORDER[-1]
+        self.tokens = tokens
+
+    async def __aenter__(self):
+        await self.scheduler.acquire(self.priority, self.tokens)
+        return self
+
+    async def __aexit__(self, *exc):
+        self.scheduler.release(self.priority)
+        return False
@@ -0,0 +1,153 @@
+"""
+message_cache.py — In-memory message history for $summary
+---------------------------------------------------------
+
+MessageRingBuffer keeps the most recent messages of one channel in a
+fixed-capacity ring:
+
+- timestamps are epoch milliseconds in an array('q'), in arrival order,
+  so "messages since T" is a binary search
+- author names are interned into a shared table and stored as ints;
+  a name is dropped from the table once its last message is evicted
+- message text is bounded by a per-channel byte budget as well as the
+  message count; the oldest entries are evicted first
+
+covers(cutoff) tells whether every message newer than `cutoff` is in the
+buffer, i.e. recording started before the cutoff, nothing newer than
+it has been evicted and no gateway disconnect has happened since (see
+mark_gap).
+"""
+
+from array import array
+from datetime import datetime, timezone
+
+MAX_CACHE = 20000
+CACHE_BYTE_BUDGET = 8 * 1024 * 1024  # per channel, message text only
+
+
+def _to_epoch_ms(ts: datetime) -> int:
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return int(ts.timestamp() * 1000)
+
+
+def _from_epoch_ms(value: int) -> datetime:
+    return datetime.fromtimestamp(value / 1000, tz=timezone.utc)
+
+
+class MessageRingBuffer:
+    def __init__(self, capacity: int = MAX_CACHE, byte_budget: int = CACHE_BYTE_BUDGET):
+        self.capacity = capacity
+        self.byte_budget = byte_budget
+        self._timestamps = array("q", [0]) * capacity
+        self._authors = array("I", [0]) * capacity
+        self._contents: list[str | None] = [None] * capacity
+        self._sizes = array("I", [0]) * capacity
+        self._head = 0          # physical index of the oldest entry
+        self._count = 0
+        self._bytes = 0
+
+        self._author_names: list[str] = []
+        self._author_ids: dict[str, int] = {}
+        self._author_refs: list[int] = []   # messages in the buffer per author id
+        self._free_author_ids: list[int] = []
+
+        # Everything after this instant is in the buffer
+        self._covered_from = _to_epoch_ms(datetime.now(timezone.utc))
+
+    def __len__(self):
+        return self._count
+
+    def _intern(self, author: str) -> int:
+        author_id = self._author_ids.get(author)
+        if author_id is None:
+            if self._free_author_ids:
+                author_id = self._free_author_ids.pop()
+                self._author_names[author_id] = author
+            else:
+                author_id = len(self._author_names)
+                self._author_names.append(author)
+                self._author_refs.append(0)
+            self._author_ids[author] = author_id
+        self._author_refs[author_id] += 1
+        return author_id
+
+    def _release(self, author_id: int):
+        self._author_refs[author_id] -= 1
+        if not self._author_refs[author_id]:
+            del self._author_ids[self._author_names[author_id]]
+            self._author_names[author_id] = ""
+            self._free_author_ids.append(author_id)
+
+    def _physical(self, logical: int) -> int:
+        return (self._head + logical) % self.capacity
+
+    def _evict_oldest(self):
+        slot = self._head
+        self._covered_from = max(self._covered_from, self._timestamps[slot] + 1)
+        self._bytes -= self._sizes[slot]
+        self._release(self._authors[slot])
+        self._contents[slot] = None
+        self._head = (self._head + 1) % self.capacity
+        self._count -= 1
+
+    def append(self, author: str, content: str, timestamp: datetime):
+        size = len(content.encode("utf-8"))
+
+        while self._count and (self._count >= self.capacity or self._bytes + size > self.byte_budget):
+            self._evict_oldest()
+
+        slot = self._physical(self._count)
+        self._timestamps[slot] = _to_epoch_ms(timestamp)
+        self._authors[slot] = self._intern(author)
+        self._contents[slot] = content
+        self._sizes[slot] = size
+        self._bytes += size
+        self._count += 1
+
+    def _entry(self, logical: int) -> tuple[str, str, datetime]:
+        slot = self._physical(logical)
+        return (
+            self._author_names[self._authors[slot]],
+            self._contents[slot],
+            _from_epoch_ms(self._timestamps[slot])
+        )
+
+    def _first_at_or_after(self, epoch_ms: int) -> int:
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._timestamps[self._physical(mid)] < epoch_ms:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def last(self, count: int) -> list[tuple[str, str, datetime]]:
+        start = max(0, self._count - count)
+        return [self._entry(i) for i in range(start, self._count)]
+
+    def since(self, cutoff: datetime) -> list[tuple[str, str, datetime]]:
+        start = self._first_at_or_after(_to_epoch_ms(cutoff))
+        return [self._entry(i) for i in range(start, self._count)]
+
+    def mark_gap(self):
+        """Messages may have been missed (gateway disconnect): only trust what arrives from now on."""
+        self._covered_from = max(self._covered_from, _to_epoch_ms(datetime.now(timezone.utc)))
+
+    def covers(self, cutoff: datetime) -> bool:
+        return _to_epoch_ms(cutoff) >= self._covered_from
+
+    def covers_last(self, count: int) -> bool:
+        # The newest `count` messages are all here, with no gap among them
+        if count > self._count:
+            return False
+        return count <= 0 or self._timestamps[self._physical(self._count - count)] >= self._covered_from
+
+    def stats(self) -> dict:
+        return {
+            "messages": self._count,
+            "bytes": self._bytes,
+            "authors": len(self._author_ids),
+            "covered_from": _from_epoch_ms(self._covered_from)
+        }
@@ -0,0 +1,522 @@
+"""
+message_store.py — Persistent message history for $summary
+-----------------------------------------------------------
+
+An on-disk SQLite store (WAL mode) of channel messages so summary
+commands run as local indexed queries instead of re-reading Discord
+history on every call.
+
+- record() stores messages as they arrive in on_message
+- sync_channel() catches up with history(after=last_seen_id) and
+  backfills older messages when a window reaches past what is stored
+- messages are indexed by (channel, time) and (channel, author, time)
+- an FTS5 full-text index over message content backs search()
+- bucket_summaries persists the hourly/daily summaries of summaries.py
+
+All Discord reads go through HistoryStream, which yields messages page
+by page, stops at the window boundary (after=/before=), retries rate
+limits with jittered exponential backoff from the last message seen, and
+reports afterwards whether the whole range was delivered.
+
+sync_state keeps, per channel, the newest message ID known to be stored
+contiguously (last_seen_id) and the time from which storage is complete
+(synced_from). While a channel is "live" (caught up and receiving
+on_message events) no catch-up call is needed at all.
+"""
+
+import asyncio
+import random
+import re
+import sqlite3
+from datetime import datetime, timedelta, timezone
+import discord
+from metrics import stage_timer
+
+MESSAGE_DB_PATH = "nyx_messages.db"
+
+# First sync of a channel with no stored history reaches back this far
+INITIAL_BACKFILL = timedelta(days=30)
+
+# Upper bound on messages pulled from Discord in a single sync pass
+SYNC_FETCH_LIMIT = 10000
+
+# Rate-limit / server error retries of a history read
+HISTORY_MAX_RETRIES = 5
+HISTORY_BACKOFF_BASE = 1.0   # seconds, doubled per attempt
+HISTORY_BACKOFF_CAP = 30.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id          INTEGER PRIMARY KEY,
+    channel_id  INTEGER NOT NULL,
+    author_id   INTEGER NOT NULL,
+    author_name TEXT    NOT NULL,
+    content     TEXT    NOT NULL,
+    created_at  INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_channel_time
+    ON messages (channel_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_messages_channel_author_time
+    ON messages (channel_id, author_id, created_at);
+
+CREATE TABLE IF NOT EXISTS authors (
+    author_id  INTEGER PRIMARY KEY,
+    name       TEXT NOT NULL,
+    name_lower TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_authors_name_lower ON authors (name_lower);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5 (
+    content,
+    content = 'messages',
+    content_rowid = 'id',
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+END;
+
+CREATE TABLE IF NOT EXISTS bucket_summaries (
+    channel_id    INTEGER NOT NULL,
+    level         TEXT    NOT NULL,
+    bucket_start  INTEGER NOT NULL,
+    message_count INTEGER NOT NULL,
+    summary       TEXT    NOT NULL,
+    PRIMARY KEY (channel_id, level, bucket_start)
+);
+
+CREATE TABLE IF NOT EXISTS sync_state (
+    channel_id   INTEGER PRIMARY KEY,
+    last_seen_id INTEGER NOT NULL,
+    synced_from  INTEGER NOT NULL
+);
+"""
+
+Row = tuple[str, str, datetime]
+
+_QUERY_TERM_RE = re.compile(r'"([^"]+)"|(\S+)')
+_WORD_RE = re.compile(r"\w+")
+
+
+def to_epoch_ms(ts: datetime) -> int:
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return int(ts.timestamp() * 1000)
+
+
+def from_epoch_ms(value: int) -> datetime:
+    return datetime.fromtimestamp(value / 1000, tz=timezone.utc)
+
+
+class MessageStore:
+    def __init__(self, path: str = MESSAGE_DB_PATH):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._rebuild_fts_if_empty()
+        self.conn.commit()
+        self._live: set[int] = set()
+
+    def _rebuild_fts_if_empty(self):
+        # Databases created before the full-text index existed
+        has_messages = self.conn.execute("SELECT 1 FROM messages LIMIT 1").fetchone()
+        # (the _docsize shadow table has one row per indexed message)
+        has_index = self.conn.execute("SELECT 1 FROM messages_fts_docsize LIMIT 1").fetchone()
+        if has_messages and not has_index:
+            self.conn.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+
+    # -----------------------------------------------------
+    # Writes
+    # -----------------------------------------------------
+    def insert_messages(self, messages: list[discord.Message]):
+        if not messages:
+            return
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO messages (id, channel_id, author_id, author_name, content, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (m.id, m.channel.id, m.author.id, m.author.display_name, m.content, to_epoch_ms(m.created_at))
+                for m in messages
+            ]
+        )
+        self.conn.executemany(
+            "INSERT INTO authors (author_id, name, name_lower) VALUES (?, ?, ?) "
+            "ON CONFLICT(author_id) DO UPDATE SET name = excluded.name, name_lower = excluded.name_lower",
+            {(m.author.id, m.author.display_name, m.author.display_name.lower()) for m in messages}
+        )
+        self.conn.commit()
+
+    def record(self, message: discord.Message):
+        self.insert_messages([message])
+        if message.channel.id in self._live:
+            self.conn.execute(
+                "UPDATE sync_state SET last_seen_id = MAX(last_seen_id, ?) WHERE channel_id = ?",
+                (message.id, message.channel.id)
+            )
+            self.conn.commit()
+
+    def get_sync_state(self, channel_id: int) -> tuple[int, int] | None:
+        row = self.conn.execute(
+            "SELECT last_seen_id, synced_from FROM sync_state WHERE channel_id = ?",
+            (channel_id,)
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def set_sync_state(self, channel_id: int, last_seen_id: int, synced_from: int):
+        self.conn.execute(
+            "INSERT INTO sync_state (channel_id, last_seen_id, synced_from) VALUES (?, ?, ?) "
+            "ON CONFLICT(channel_id) DO UPDATE SET last_seen_id = excluded.last_seen_id, "
+            "synced_from = excluded.synced_from",
+            (channel_id, last_seen_id, synced_from)
+        )
+        self.conn.commit()
+
+    def mark_live(self, channel_id: int):
+        self._live.add(channel_id)
+
+    def mark_all_offline(self):
+        self._live.clear()
+
+    def is_live(self, channel_id: int) -> bool:
+        return channel_id in self._live
+
+    # -----------------------------------------------------
+    # Queries (all return oldest-first (author, content, ts))
+    # -----------------------------------------------------
+    def _rows(self, sql: str, params: tuple) -> list[Row]:
+        return [(a, c, from_epoch_ms(ts)) for a, c, ts in self.conn.execute(sql, params)]
+
+    def count(self, channel_id: int) -> int:
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM messages WHERE channel_id = ?", (channel_id,)
+        ).fetchone()[0]
+
+    def newest_id(self, channel_id: int) -> int | None:
+        return self.conn.execute(
+            "SELECT MAX(id) FROM messages WHERE channel_id = ?", (channel_id,)
+        ).fetchone()[0]
+
+    def count_since(self, channel_id: int, cutoff: datetime) -> int:
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM messages WHERE channel_id = ? AND created_at >= ?",
+            (channel_id, to_epoch_ms(cutoff))
+        ).fetchone()[0]
+
+    def between(self, channel_id: int, start_ms: int, end_ms: int) -> list[Row]:
+        return self._rows(
+            "SELECT author_name, content, created_at FROM messages "
+            "WHERE channel_id = ? AND created_at >= ? AND created_at < ? ORDER BY created_at, id",
+            (channel_id, start_ms, end_ms)
+        )
+
+    def bucket_counts(self, channel_id: int, start_ms: int, end_ms: int, bucket_ms: int) -> dict[int, int]:
+        # {bucket_start_ms: message_count} for non-empty buckets in [start, end)
+        return dict(self.conn.execute(
+            "SELECT (created_at / ?) * ?, COUNT(*) FROM messages "
+            "WHERE channel_id = ? AND created_at >= ? AND created_at < ? GROUP BY 1",
+            (bucket_ms, bucket_ms, channel_id, start_ms, end_ms)
+        ))
+
+    def since(self, channel_id: int, cutoff: datetime) -> list[Row]:
+        return self._rows(
+            "SELECT author_name, content, created_at FROM messages "
+            "WHERE channel_id = ? AND created_at >= ? ORDER BY created_at, id",
+            (channel_id, to_epoch_ms(cutoff))
+        )
+
+    def last(self, channel_id: int, count: int) -> list[Row]:
+        rows = self._rows(
+            "SELECT author_name, content, created_at FROM messages "
+            "WHERE channel_id = ? ORDER BY created_at DESC, id DESC LIMIT ?",
+            (channel_id, count)
+        )
+        rows.reverse()
+        return rows
+
+    def _scope_start(self, channel_id: int, scope: int) -> int:
+        # created_at of the oldest message among the newest `scope` messages
+        row = self.conn.execute(
+            "SELECT created_at FROM messages WHERE channel_id = ? "
+            "ORDER BY created_at DESC LIMIT 1 OFFSET ?",
+            (channel_id, scope - 1)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def by_author(self, channel_id: int, name: str, scope: int) -> list[Row]:
+        author_ids = [
+            r[0] for r in self.conn.execute(
+                "SELECT author_id FROM authors WHERE name_lower = ?", (name.lower(),)
+            )
+        ]
+        if not author_ids:
+            return []
+
+        placeholders = ",".join("?" * len(author_ids))
+        return self._rows(
+            "SELECT author_name, content, created_at FROM messages "
+            f"WHERE channel_id = ? AND author_id IN ({placeholders}) AND created_at >= ? "
+            "ORDER BY created_at, id",
+            (channel_id, *author_ids, self._scope_start(channel_id, scope))
+        )
+
+    def search(self, channel_id: int, query: str, since: datetime | None = None, limit: int = 500) -> list[Row]:
+        """
+        Full-text search. `query` is user input (see build_fts_query);
+        returns the newest `limit` matches, oldest-first.
+        """
+        fts_query = build_fts_query(query)
+        if not fts_query:
+            return []
+
+        rows = self._rows(
+            # CROSS JOIN keeps the FTS lookup as the outer loop
+            "SELECT m.author_name, m.content, m.created_at FROM messages_fts f "
+            "CROSS JOIN messages m ON m.id = f.rowid "
+            "WHERE messages_fts MATCH ? AND m.channel_id = ? AND m.created_at >= ? "
+            "ORDER BY m.created_at DESC LIMIT ?",
+            (fts_query, channel_id, to_epoch_ms(since) if since else 0, limit)
+        )
+        rows.reverse()
+        return rows
+
+    def author_counts(self, channel_id: int, scope: int, top: int) -> list[tuple[str, int]]:
+        return list(self.conn.execute(
+            "SELECT a.name, COUNT(*) AS n FROM messages m JOIN authors a ON a.author_id = m.author_id "
+            "WHERE m.channel_id = ? AND m.created_at >= ? "
+            "GROUP BY m.author_id ORDER BY n DESC LIMIT ?",
+            (channel_id, self._scope_start(channel_id, scope), top)
+        ))
+
+    # -----------------------------------------------------
+    # Bucket summaries
+    # -----------------------------------------------------
+    def get_bucket_summaries(self, channel_id: int, level: str, start_ms: int, end_ms: int) -> dict[int, tuple[int, str]]:
+        # {bucket_start_ms: (message_count, summary)}
+        return {
+            start: (count, summary)
+            for start, count, summary in self.conn.execute(
+                "SELECT bucket_start, message_count, summary FROM bucket_summaries "
+                "WHERE channel_id = ? AND level = ? AND bucket_start >= ? AND bucket_start < ?",
+                (channel_id, level, start_ms, end_ms)
+            )
+        }
+
+    def save_bucket_summary(self, channel_id: int, level: str, start_ms: int, message_count: int, summary: str):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO bucket_summaries (channel_id, level, bucket_start, message_count, summary) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (channel_id, level, start_ms, message_count, summary)
+        )
+        self.conn.commit()
+
+
+def build_fts_query(text: str) -> str:
+    """
+    Turns user input into a safe FTS5 query. All terms must match.
+      tower fields      -> both words
+      "tower fields"    -> exact phrase
+      inf*              -> prefix
+    """
+    terms = []
+    for phrase, word in _QUERY_TERM_RE.findall(text):
+        if phrase:
+            tokens = _WORD_RE.findall(phrase)
+            if tokens:
+                terms.append('"' + " ".join(tokens) + '"')
+            continue
+
+        tokens = _WORD_RE.findall(word)
+        if not tokens:
+            continue
+        term = '"' + " ".join(tokens) + '"'
+        if word.endswith("*"):
+            term += "*"
+        terms.append(term)
+    return " ".join(terms)
+
+
+# ---------------------------------------------------------
+# Streaming history reader
+# ---------------------------------------------------------
+class HistoryStream:
+    """
+    Async iterator over channel.history() between `after` and `before`.
+
+    Messages are yielded as Discord returns them. On a 429 or 5xx the
+    read is retried with jittered exponential backoff, resuming after the
+    last message yielded. Once iteration ends, `complete` tells whether
+    every message in the range was delivered; `error` holds the exception
+    that cut it short, if any.
+    """
+
+    def __init__(self, channel: discord.TextChannel, after=None, before=None,
+                 oldest_first: bool = True, limit: int | None = None):
+        self.channel = channel
+        self.after = after
+        self.before = before
+        self.oldest_first = oldest_first
+        self.limit = limit
+        self.complete = False
+        self.error: discord.HTTPException | None = None
+        self.fetched = 0
+        self.retries = 0
+
+    def __aiter__(self):
+        return self._stream()
+
+    async def _stream(self):
+        attempt = 0
+        while self.limit is None or self.fetched < self.limit:
+            remaining = None if self.limit is None else self.limit - self.fetched
+            start = self.fetched
+            history = self.channel.history(
+                after=self.after, before=self.before, oldest_first=self.oldest_first, limit=remaining
+            )
+            try:
+                async for msg in history:
+                    # Move the window edge so a retry resumes from here
+                    if self.oldest_first:
+                        self.after = discord.Object(id=msg.id)
+                    else:
+                        self.before = discord.Object(id=msg.id)
+                    self.fetched += 1
+                    attempt = 0
+                    yield msg
+            except discord.HTTPException as e:
+                retryable = e.status == 429 or e.status >= 500
+                if not retryable or attempt >= HISTORY_MAX_RETRIES:
+                    print(f"DEBUG: History read of {self.channel.id} stopped after {self.fetched} messages: {e}")
+                    self.error = e
+                    return
+                delay = _backoff_delay(attempt, e)
+                attempt += 1
+                self.retries += 1
+                print(f"DEBUG: History read of {self.channel.id} got {e.status}, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            # history() ran dry before the limit: the range is exhausted
+            self.complete = remaining is None or self.fetched - start < remaining
+            return
+
+
+def _backoff_delay(attempt: int, error: discord.HTTPException) -> float:
+    delay = min(HISTORY_BACKOFF_CAP, HISTORY_BACKOFF_BASE * 2 ** attempt)
+    delay = delay / 2 + random.uniform(0, delay / 2)
+
+    # Never retry sooner than Discord asked
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        delay = max(delay, float(headers.get("Retry-After", 0)))
+    except (TypeError, ValueError):
+        pass
+    return delay
+
+
+# ---------------------------------------------------------
+# Incremental sync with Discord
+# ---------------------------------------------------------
+async def _fetch_into(store: MessageStore, stream: HistoryStream) -> list[int]:
+    """Drains a HistoryStream into the store in pages and returns the IDs fetched."""
+    ids: list[int] = []
+    page: list[discord.Message] = []
+    with stage_timer("history_fetch", "summary"):
+        async for msg in stream:
+            page.append(msg)
+            ids.append(msg.id)
+            if len(page) >= 100:
+                store.insert_messages(page)
+                page = []
+
+        store.insert_messages(page)
+    return ids
+
+
+def _oldest_ms(ids: list[int]) -> int:
+    return to_epoch_ms(discord.utils.snowflake_time(min(ids)))
+
+
+async def sync_channel(store: MessageStore, channel: discord.TextChannel, since: datetime | None = None) -> bool:
+    """
+    Brings the stored history of `channel` up to date and, when `since`
+    reaches past what is stored, backfills the gap.
+    Returns True if the store now holds every message since `since`.
+    """
+    now = datetime.now(timezone.utc)
+    state = store.get_sync_state(channel.id)
+
+    if state is None:
+        start = since or (now - INITIAL_BACKFILL)
+        stream = HistoryStream(channel, after=start, limit=SYNC_FETCH_LIMIT)
+        ids = await _fetch_into(store, stream)
+        last_seen = max(ids) if ids else discord.utils.time_snowflake(start)
+        store.set_sync_state(channel.id, last_seen, to_epoch_ms(start))
+        return stream.complete
+
+    last_seen_id, synced_from = state
+    complete = True
+
+    # Backfill older messages the stored range does not cover yet.
+    # Newest first, so a partial read still extends coverage downwards.
+    if since is not None and to_epoch_ms(since) < synced_from:
+        stream = HistoryStream(
+            channel, after=since, before=from_epoch_ms(synced_from), oldest_first=False, limit=SYNC_FETCH_LIMIT
+        )
+        ids = await _fetch_into(store, stream)
+        if stream.complete:
+            synced_from = to_epoch_ms(since)
+        else:
+            complete = False
+            if ids:
+                synced_from = _oldest_ms(ids)
+
+    # Forward catch-up, unless on_message is already keeping us current
+    if not store.is_live(channel.id):
+        stream = HistoryStream(channel, after=discord.Object(id=last_seen_id), limit=SYNC_FETCH_LIMIT)
+        ids = await _fetch_into(store, stream)
+        if ids:
+            last_seen_id = max(last_seen_id, max(ids))
+        complete = complete and stream.complete
+
+    store.set_sync_state(channel.id, last_seen_id, synced_from)
+    return complete
+
+
+async def ensure_count(store: MessageStore, channel: discord.TextChannel, count: int) -> bool:
+    """
+    Makes sure the newest `count` messages of `channel` are stored,
+    backfilling older history if needed.
+    """
+    complete = await sync_channel(store, channel)
+
+    missing = count - store.count(channel.id)
+    state = store.get_sync_state(channel.id)
+    if missing <= 0 or state is None or state[1] == 0:
+        return complete
+
+    last_seen_id, synced_from = state
+    stream = HistoryStream(channel, before=from_epoch_ms(synced_from), oldest_first=False, limit=missing)
+    ids = await _fetch_into(store, stream)
+
+    # Reached the start of the channel, or coverage now starts at the
+    # oldest message fetched (pages are contiguous, even when cut short)
+    if stream.complete:
+        synced_from = 0
+    elif ids:
+        synced_from = _oldest_ms(ids)
+    store.set_sync_state(channel.id, last_seen_id, synced_from)
+
+    if stream.error is not None:
+        return False
+    return complete
+
+
+async def go_live(store: MessageStore, channel: discord.TextChannel):
+    """Catches a channel up on startup and marks it as kept current by on_message."""
+    if await sync_channel(store, channel):
+        store.mark_live(channel.id)
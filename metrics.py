@@ -0,0 +1,262 @@
+"""
+metrics.py — Prometheus metrics for Nyx
+---------------------------------------
+
+A small in-process registry rendered in the Prometheus text format and
+served on a local HTTP endpoint (aiohttp, already installed with
+discord.py) at http://METRICS_HOST:METRICS_PORT/metrics.
+
+Shared metrics:
+- stage_seconds   latency histogram per stage (history_fetch, prompt_build,
+                  llm_call, json_parse, discord_send) and feature
+                  (moderation, summary, recruit)
+- verdicts        moderation verdicts by source and outcome
+- cache_lookups   hits and misses per cache
+- llm_requests / llm_errors   per priority class
+
+Queue depths and session counts are gauges whose values are read from
+their owners at scrape time; owners register them with
+registry.gauge(..., callback=...) at import time.
+
+Settings (.env):
+- METRICS_HOST    bind address (default 127.0.0.1)
+- METRICS_PORT    port (default 9108, 0 = endpoint disabled)
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+# metrics is imported before bot.py calls load_dotenv, so load .env here
+load_dotenv()
+
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    value = float(value)
+    if value == float("inf"):
+        return "+Inf"
+    if value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+# ---------------------------------------------------------
+# Metric types
+# ---------------------------------------------------------
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self) -> list[tuple[str, dict, float]]:
+        """(metric name, labels, value) lines for the exposition."""
+        raise NotImplementedError
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self):
+        return [(self.name, dict(zip(self.labelnames, key)), value) for key, value in sorted(self._values.items())]
+
+
+class Gauge(Metric):
+    """
+    Either set() directly, or give a callback returning a number (no
+    labels) or a dict of label-value tuples to numbers.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = (), callback=None):
+        super().__init__(name, help_text, labelnames)
+        self.callback = callback
+        self._values: dict[tuple, float] = {}
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def samples(self):
+        values = dict(self._values)
+        if self.callback is not None:
+            try:
+                current = self.callback()
+            except Exception as e:
+                print(f"DEBUG: Gauge {self.name} callback failed: {e}")
+                current = {}
+            if isinstance(current, dict):
+                values.update({tuple(str(v) for v in key): value for key, value in current.items()})
+            else:
+                values[()] = current
+        return [(self.name, dict(zip(self.labelnames, key)), value) for key, value in sorted(values.items())]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series: dict[tuple, list] = {}  # key -> [bucket counts, sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[0][i] += 1
+                break
+        series[1] += value
+        series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        result = []
+        for key, (counts, total, count) in sorted(self._series.items()):
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                result.append((self.name + "_bucket", dict(labels, le=_format_value(bound)), cumulative))
+            result.append((self.name + "_sum", labels, total))
+            result.append((self.name + "_count", labels, count))
+        return result
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+
+    def _register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames: tuple[str, ...] = (), callback=None) -> Gauge:
+        return self._register(Gauge(name, help_text, labelnames, callback))
+
+    def histogram(self, name: str, help_text: str, labelnames: tuple[str, ...] = (),
+                  buckets: tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# ---------------------------------------------------------
+# Shared metrics
+# ---------------------------------------------------------
+registry = Registry()
+
+stage_seconds = registry.histogram(
+    "nyx_stage_seconds", "Latency of each processing stage.", ("stage", "feature")
+)
+verdicts = registry.counter(
+    "nyx_moderation_verdicts_total", "Darknet moderation verdicts.", ("source", "outcome")
+)
+cache_lookups = registry.counter(
+    "nyx_cache_lookups_total", "Cache lookups by cache and result (hit/miss).", ("cache", "result")
+)
+llm_requests = registry.counter(
+    "nyx_llm_requests_total", "LLM requests sent, by priority class.", ("priority",)
+)
+llm_errors = registry.counter(
+    "nyx_llm_errors_total", "LLM requests that raised, by priority class.", ("priority",)
+)
+
+
+def stage_timer(stage: str, feature: str):
+    """with stage_timer("llm_call", "moderation"): ..."""
+    return stage_seconds.time(stage=stage, feature=feature)
+
+
+def cache_lookup(cache: str, hit: bool):
+    cache_lookups.inc(cache=cache, result="hit" if hit else "miss")
+
+
+# ---------------------------------------------------------
+# HTTP endpoint
+# ---------------------------------------------------------
+_runner = None
+
+
+async def start_metrics_server(host: str = METRICS_HOST, port: int = METRICS_PORT):
+    """Serves /metrics; safe to call again (e.g. from a repeated on_ready)."""
+    global _runner
+    if port <= 0 or _runner is not None:
+        return
+
+    from aiohttp import web
+
+    async def handle_metrics(request):
+        return web.Response(
+            body=registry.render().encode("utf-8"),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+        )
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError as e:
+        print(f"DEBUG: Metrics endpoint not started on {host}:{port}: {e}")
+        await runner.cleanup()
+        return
+
+    _runner = runner
+    print(f"DEBUG: Metrics endpoint on http://{host}:{port}/metrics")
@@ -0,0 +1,660 @@
+"""
+moderation.py — Darknet moderation engine
+-----------------------------------------
+
+Modules included:
+- Rules / moderation guidance loaders (rules.txt, moderationguide.txt)
+- Prebuilt prompt template, rebuilt and swapped in when either file
+  changes (config_watcher.py); its version invalidates the verdict caches
+- Gemini context cache holding the static preamble, so each call only
+  sends the relay text (ModerationContextCache); created in the
+  background and only once the preamble reaches Gemini's minimum size
+- Single-message Gemini moderation (analyse_message_moderation)
+- Micro-batching stage: relay lines arriving within a short window are
+  sent to Gemini as one numbered request and the verdict array is mapped
+  back to each caller (ModerationBatcher)
+- Local rule pre-filter for certain verdicts (prefilter.py)
+- Verdict cache for repeated relay spam (moderate_message_text)
+- Near-duplicate verdict reuse via SimHash (moderate_message_text)
+- Resilience (resilience.py): a circuit breaker over Gemini errors and
+  slow calls, a hedged request to the fallback model once a call runs
+  past the observed p95, and a re-evaluation queue for messages that
+  could not be moderated (ReevaluationQueue) instead of passing them
+- Stage timings, verdict and cache counters and queue gauges (metrics.py)
+"""
+
+import json
+import time
+import asyncio
+from collections import deque
+from llm import generate_content, create_cached_content, delete_cached_content, MODELS, CHARS_PER_TOKEN
+from verdict_cache import VerdictCache, SimHashIndex
+from prefilter import load_prefilter
+from config_watcher import config_watcher
+from resilience import CircuitBreaker, LatencyTracker, hedged, CLOSED
+from metrics import registry, stage_timer, verdicts, cache_lookup
+
+MODERATION_MODEL = MODELS["moderation"]
+FALLBACK_MODEL = MODELS["moderation_fallback"]
+
+# Batching: wait up to BATCH_WINDOW_SECONDS after the first queued message,
+# or until BATCH_MAX_SIZE messages are queued, then send them together.
+BATCH_WINDOW_SECONDS = 1.5
+BATCH_MAX_SIZE = 20
+
+API_ERROR_REASON = "Gemini API error"
+PARSE_ERROR_REASON = "Unreadable Gemini reply"
+DEFERRED_REASON = "Moderation deferred: Gemini unavailable"
+NEEDS_REVIEW_REASON = "Not moderated: Gemini gave no usable verdict"
+
+# Hedging: the fallback model is asked once the primary call runs past
+# the observed p95 (clamped), and no verdict takes longer than the deadline.
+HEDGE_MIN_SECONDS = 2.0
+HEDGE_MAX_SECONDS = 8.0
+HEDGE_DEFAULT_SECONDS = 5.0
+MODERATION_DEADLINE_SECONDS = 20.0
+
+# Messages waiting for the breaker to close; the oldest are dropped beyond this
+REEVALUATION_MAX_SIZE = 500
+REEVALUATION_RETRY_SECONDS = 30.0
+# A message still without a verdict this long after it arrived is posted
+# for manual review instead; far longer than a normal Gemini outage
+REEVALUATION_GIVE_UP_SECONDS = 6 * 3600
+
+# Context caching of the system prompt. Re-created this long before it
+# expires; after a failed create, full prompts are sent for a while.
+CONTEXT_CACHE_ENABLED = True
+CONTEXT_CACHE_TTL_SECONDS = 3600
+CONTEXT_CACHE_REFRESH_MARGIN = 120
+CONTEXT_CACHE_RETRY_SECONDS = 600
+# Gemini rejects cached contents smaller than this
+CONTEXT_CACHE_MIN_TOKENS = 1024
+
+VERDICT_KEYS = ("violation", "rule", "reason", "recommended_action", "short_summary", "confidence")
+
+# ---------------------------------------------------------
+# Load external files
+# ---------------------------------------------------------
+def load_rules():
+    try:
+        with open("rules.txt", "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return "No rules found."
+
+def load_moderation_guidance():
+    try:
+        with open("moderationguide.txt", "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return "You are an automated moderation system."
+
+# ---------------------------------------------------------
+# Prompt template (rebuilt only when the files change)
+# ---------------------------------------------------------
+def build_system_prompt(guidance: str, rules: str) -> str:
+    return (
+        guidance
+        + "\n\nRules:\n"
+        + rules
+        + "\n\nContextual Notes:\n"
+          "- In Anarchy Online trade messages, the word 'free' inside a WTS (want to sell) message is normal trade language. "
+          "It does not indicate begging, solicitation, manipulation, or any rule-breaking. "
+          "Do not flag 'free' as a violation when it appears in a WTS context.\n"
+    )
+
+class PromptTemplate:
+    """Immutable snapshot of the moderation prompt pieces for one config version."""
+
+    def __init__(self, version: int, guidance: str, rules: str):
+        self.version = version
+        self.system_prompt = build_system_prompt(guidance, rules)
+        self.preamble = self.system_prompt + "\n\n"
+        self.batch_suffix = (
+            "- Respond ONLY with a JSON array containing one object per message.\n"
+            "- Each object must contain the key 'id' (the message number) plus the keys defined above.\n"
+            "\n\nMessages:\n"
+        )
+
+    # Bodies are what follows the system prompt; sent alone when it is cached
+    def single_body(self, message_text: str) -> str:
+        return "Message:\n" + message_text
+
+    def batch_body(self, numbered: str, count: int) -> str:
+        return (
+            "Batch Instructions:\n"
+            f"- You will receive {count} numbered messages. Evaluate each one independently.\n"
+            + self.batch_suffix
+            + numbered
+        )
+
+prompt_template = PromptTemplate(1, load_moderation_guidance(), load_rules())
+
+def reload_prompt_template():
+    # Build the new template completely, then swap it in with one assignment
+    global prompt_template
+    prompt_template = PromptTemplate(prompt_template.version + 1, load_moderation_guidance(), load_rules())
+    print(f"DEBUG: Moderation prompt rebuilt (version {prompt_template.version})")
+
+def prompt_version() -> int:
+    return prompt_template.version
+
+config_watcher.watch(("rules.txt", "moderationguide.txt"), reload_prompt_template)
+
+# ---------------------------------------------------------
+# Context cache for the static preamble
+# ---------------------------------------------------------
+class ModerationContextCache:
+    """
+    Keeps one Gemini cached context holding the system prompt of the
+    current PromptTemplate. A new one is created when the template
+    version changes or the old one is about to expire.
+
+    Creation runs in a background task, never inside a moderation call:
+    get() answers None (send the prompt inline) until the cache exists.
+    Prompts below Gemini's minimum cacheable size are never cached.
+
+    Note: the shipped rules.txt and moderationguide.txt make a preamble of
+    only ~970 tokens, under CONTEXT_CACHE_MIN_TOKENS, so with those files
+    the cache stays off and every call sends the prompt inline. It only
+    turns on once the rules or guide grow past the minimum.
+    """
+
+    def __init__(self, ttl: int = CONTEXT_CACHE_TTL_SECONDS, min_tokens: int = CONTEXT_CACHE_MIN_TOKENS):
+        self.ttl = ttl
+        self.min_tokens = min_tokens
+        self.creates = 0
+        self._name: str | None = None
+        self._version: int | None = None
+        self._expires_at = 0.0
+        self._retry_at = 0.0
+        self._task: asyncio.Task | None = None
+        self._too_small_version: int | None = None
+
+    def _valid_for(self, template: PromptTemplate) -> bool:
+        return (
+            self._name is not None
+            and self._version == template.version
+            and time.monotonic() < self._expires_at
+        )
+
+    def cacheable(self, template: PromptTemplate) -> bool:
+        tokens = len(template.system_prompt) // CHARS_PER_TOKEN
+        if tokens >= self.min_tokens:
+            return True
+        if self._too_small_version != template.version:
+            self._too_small_version = template.version
+            print(f"DEBUG: Moderation prompt (~{tokens} tokens) below the {self.min_tokens} token cache minimum, sending inline")
+        return False
+
+    async def get(self, template: PromptTemplate) -> str | None:
+        """Name of a cache holding template.system_prompt, or None to send it inline."""
+        if not CONTEXT_CACHE_ENABLED or not self.cacheable(template):
+            return None
+        if self._valid_for(template):
+            return self._name
+
+        if time.monotonic() >= self._retry_at and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self.refresh(template))
+        return None
+
+    async def refresh(self, template: PromptTemplate) -> str | None:
+        """Creates the cache for `template`, replacing (and deleting) the previous one."""
+        stale = self._name
+        self._name = None
+        try:
+            cache = await create_cached_content(
+                model=MODERATION_MODEL,
+                config={
+                    "system_instruction": template.system_prompt,
+                    "ttl": f"{self.ttl}s",
+                    "display_name": f"nyx-moderation-v{template.version}"
+                },
+                priority="moderation"
+            )
+        except Exception as e:
+            print(f"DEBUG: Context cache create failed, sending full prompts: {e}")
+            self._retry_at = time.monotonic() + CONTEXT_CACHE_RETRY_SECONDS
+            return None
+
+        self._name = cache.name
+        self._version = template.version
+        self._expires_at = time.monotonic() + self.ttl - CONTEXT_CACHE_REFRESH_MARGIN
+        self.creates += 1
+        print(f"DEBUG: Context cache {cache.name} created for prompt version {template.version}")
+
+        if stale is not None and stale != cache.name:
+            await delete_cached_content(stale)
+        return self._name
+
+    def invalidate(self, name: str):
+        if self._name == name:
+            self._name = None
+
+context_cache = ModerationContextCache()
+
+class ModerationUnavailable(Exception):
+    pass
+
+breaker = CircuitBreaker()
+latency = LatencyTracker()
+
+async def _generate_primary(template: PromptTemplate, body: str):
+    """
+    Sends `body` against the cached preamble when possible, otherwise
+    (or if the cached call fails) with the full prompt inline.
+    """
+    cache_name = await context_cache.get(template)
+    if cache_name is not None:
+        try:
+            return await generate_content(
+                model=MODERATION_MODEL,
+                contents=[{"role": "user", "parts": [{"text": body}]}],
+                config={"cached_content": cache_name},
+                priority="moderation"
+            )
+        except Exception as e:
+            # Most likely expired or deleted server-side; rebuild next time
+            print(f"DEBUG: Cached moderation call failed, retrying inline: {e}")
+            context_cache.invalidate(cache_name)
+
+    return await generate_content(
+        model=MODERATION_MODEL,
+        contents=[{"role": "user", "parts": [{"text": template.preamble + body}]}],
+        priority="moderation"
+    )
+
+async def _generate_fallback(template: PromptTemplate, body: str):
+    return await generate_content(
+        model=FALLBACK_MODEL,
+        contents=[{"role": "user", "parts": [{"text": template.preamble + body}]}],
+        priority="moderation"
+    )
+
+def hedge_delay() -> float:
+    p95 = latency.percentile(0.95, HEDGE_DEFAULT_SECONDS)
+    return min(HEDGE_MAX_SECONDS, max(HEDGE_MIN_SECONDS, p95))
+
+async def generate_moderation(template: PromptTemplate, body: str):
+    """
+    Runs the moderation call behind the circuit breaker. A call still
+    unanswered after hedge_delay() is raced against the fallback model,
+    and the whole attempt gives up after MODERATION_DEADLINE_SECONDS.
+    Raises ModerationUnavailable straight away while the breaker is open.
+    """
+    if not breaker.allow():
+        raise ModerationUnavailable(f"Circuit breaker open, retry in {breaker.retry_in():.0f}s")
+
+    started = time.monotonic()
+    try:
+        response, source = await asyncio.wait_for(
+            hedged(
+                lambda: _generate_primary(template, body),
+                lambda: _generate_fallback(template, body),
+                hedge_delay()
+            ),
+            MODERATION_DEADLINE_SECONDS
+        )
+    except (Exception, asyncio.CancelledError):
+        breaker.record_failure()
+        raise
+
+    elapsed = time.monotonic() - started
+    breaker.record_success(elapsed)
+    if source == "primary":
+        latency.add(elapsed)
+    else:
+        print(f"DEBUG: Moderation answered by fallback model after {elapsed:.1f}s")
+    return response
+
+# ---------------------------------------------------------
+# Response helpers
+# ---------------------------------------------------------
+
+def error_verdict() -> dict:
+    return {
+        "violation": False,
+        "rule": "",
+        "reason": API_ERROR_REASON,
+        "recommended_action": "No Action",
+        "short_summary": "No violation detected.",
+        "confidence": 0.0
+    }
+
+def parse_error_verdict() -> dict:
+    # The call succeeded but the reply was not a usable verdict
+    return dict(error_verdict(), reason=PARSE_ERROR_REASON)
+
+def needs_review_verdict() -> dict:
+    return {
+        "violation": False,
+        "rule": "",
+        "reason": NEEDS_REVIEW_REASON,
+        "recommended_action": "Manual review",
+        "short_summary": "This message could not be moderated automatically.",
+        "confidence": 0.0,
+        "needs_review": True
+    }
+
+def parse_json_response(text: str):
+    raw = (text or "").strip()
+    if raw.startswith("```"):
+        raw = raw.strip("`").strip()
+    if raw.lower().startswith("json"):
+        raw = raw[4:].strip()
+    return json.loads(raw)
+
+# ---------------------------------------------------------
+# GEMINI MODERATION (Darknet ONLY)
+# ---------------------------------------------------------
+async def analyse_message_moderation(message_text: str) -> dict:
+    template = prompt_template
+    with stage_timer("prompt_build", "moderation"):
+        body = template.single_body(message_text)
+
+    try:
+        response = await generate_moderation(template, body)
+    except Exception:
+        return error_verdict()
+
+    try:
+        with stage_timer("json_parse", "moderation"):
+            parsed = parse_json_response(response.text)
+    except Exception:
+        return parse_error_verdict()
+
+    if not isinstance(parsed, dict) or not all(k in parsed for k in VERDICT_KEYS):
+        return parse_error_verdict()
+    return parsed
+
+async def analyse_message_batch(message_texts: list[str]) -> list[dict]:
+    """
+    Moderates several relay lines in one Gemini request.
+    Any message whose verdict is missing or malformed in the batch response
+    is re-checked on its own with analyse_message_moderation(). If the
+    request itself fails, every message gets error_verdict() instead, so
+    a struggling provider is not hit with N single retries.
+    """
+    if len(message_texts) == 1:
+        return [await analyse_message_moderation(message_texts[0])]
+
+    template = prompt_template
+    with stage_timer("prompt_build", "moderation"):
+        numbered = "\n".join(f"{i}. {text}" for i, text in enumerate(message_texts, start=1))
+        body = template.batch_body(numbered, len(message_texts))
+
+    verdicts: list[dict | None] = [None] * len(message_texts)
+
+    try:
+        response = await generate_moderation(template, body)
+    except Exception:
+        print("DEBUG: Batch moderation call failed, deferring the whole batch")
+        return [error_verdict() for _ in message_texts]
+
+    try:
+        with stage_timer("json_parse", "moderation"):
+            parsed = parse_json_response(response.text)
+
+        if isinstance(parsed, list):
+            for position, item in enumerate(parsed):
+                if not isinstance(item, dict):
+                    continue
+                try:
+                    index = int(item.get("id", position + 1)) - 1
+                except (TypeError, ValueError):
+                    continue
+                if 0 <= index < len(verdicts) and all(k in item for k in VERDICT_KEYS):
+                    verdicts[index] = {k: item[k] for k in VERDICT_KEYS}
+
+    except Exception:
+        print("DEBUG: Batch moderation reply unreadable, falling back to single requests")
+
+    # Per-message fallback for anything the batch did not answer cleanly
+    missing = [i for i, v in enumerate(verdicts) if v is None]
+    if missing:
+        fallback = await asyncio.gather(
+            *(analyse_message_moderation(message_texts[i]) for i in missing)
+        )
+        for i, verdict in zip(missing, fallback):
+            verdicts[i] = verdict
+
+    return verdicts
+
+# ---------------------------------------------------------
+# Micro-batching stage
+# ---------------------------------------------------------
+class ModerationBatcher:
+    """
+    Collects Darknet messages for up to `window` seconds (or until
+    `max_size` are queued) and moderates them as one batch.
+    Callers simply await submit(text) and receive their own verdict.
+    """
+
+    def __init__(self, window: float = BATCH_WINDOW_SECONDS, max_size: int = BATCH_MAX_SIZE):
+        self.window = window
+        self.max_size = max_size
+        self._pending: list[tuple[str, asyncio.Future]] = []
+        self._timer: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    async def submit(self, message_text: str) -> dict:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((message_text, future))
+
+        if len(self._pending) >= self.max_size:
+            self._flush_now()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+        return await future
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.window)
+        self._timer = None
+        self._flush_now()
+
+    def _flush_now(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.create_task(self._run_batch(batch))
+
+    async def _run_batch(self, batch: list[tuple[str, asyncio.Future]]):
+        texts = [text for text, _ in batch]
+        print(f"DEBUG: Moderating batch of {len(texts)} Darknet messages")
+
+        try:
+            verdicts = await analyse_message_batch(texts)
+        except Exception:
+            verdicts = [error_verdict() for _ in texts]
+
+        for (_, future), verdict in zip(batch, verdicts):
+            if not future.done():
+                future.set_result(verdict)
+
+moderation_batcher = ModerationBatcher()
+prefilter = load_prefilter()
+verdict_cache = VerdictCache(version_source=prompt_version)
+near_duplicates = SimHashIndex(version_source=prompt_version)
+
+def remember_verdict(message_text: str, analysis: dict, version: int):
+    # `version` is prompt_version() from when the verdict was requested;
+    # the caches skip it if the rules were reloaded in the meantime
+    verdict_cache.put(message_text, analysis, version)
+    near_duplicates.add(message_text, analysis, prefilter.review_hits(message_text), version)
+
+def count_verdict(source: str, analysis: dict) -> dict:
+    if analysis.get("deferred"):
+        outcome = "deferred"
+    elif analysis.get("needs_review"):
+        outcome = "needs_review"
+    else:
+        outcome = "violation" if analysis.get("violation") else "clean"
+    verdicts.inc(source=source, outcome=outcome)
+    return analysis
+
+def deferred_verdict() -> dict:
+    return {
+        "violation": False,
+        "rule": "",
+        "reason": DEFERRED_REASON,
+        "recommended_action": "Pending",
+        "short_summary": "Queued for re-evaluation.",
+        "confidence": 0.0,
+        "deferred": True
+    }
+
+# ---------------------------------------------------------
+# Re-evaluation queue
+# ---------------------------------------------------------
+class ReevaluationQueue:
+    """
+    Holds messages that could not be moderated while Gemini was failing.
+    Once the breaker lets calls through again they are re-checked in
+    batches and each verdict is handed to the caller's callback
+    (an async function taking the analysis dict).
+
+    Re-checks only start once the breaker would let a call through, so
+    time spent open costs nothing. A message still without a verdict
+    REEVALUATION_GIVE_UP_SECONDS after it was queued, or whose reply
+    cannot be read, is handed over as a needs_review_verdict() instead of
+    being retried forever. Beyond `max_size` the oldest messages are
+    dropped (logged and counted in `dropped`).
+    """
+
+    def __init__(self, max_size: int = REEVALUATION_MAX_SIZE, give_up_after: float = REEVALUATION_GIVE_UP_SECONDS):
+        self.max_size = max_size
+        self.give_up_after = give_up_after
+        self._items: deque[tuple[str, object, float]] = deque()  # (text, callback, queued_at)
+        self._task: asyncio.Task | None = None
+        self._closed = asyncio.Event()
+        self.dropped = 0
+        breaker.on_close(self._closed.set)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def add(self, message_text: str, callback):
+        self._items.append((message_text, callback, time.monotonic()))
+        while len(self._items) > self.max_size:
+            dropped_text, _, _ = self._items.popleft()
+            self.dropped += 1
+            print(f"DEBUG: Re-evaluation queue full, dropped oldest message ({self.dropped} so far): {dropped_text[:80]}")
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _wait_for_breaker(self):
+        # Never spend a re-check on a call the breaker would refuse
+        while not breaker.accepting():
+            self._closed.clear()
+            try:
+                await asyncio.wait_for(self._closed.wait(), max(1.0, breaker.retry_in()))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run(self):
+        while self._items:
+            await self._wait_for_breaker()
+
+            batch = [self._items.popleft() for _ in range(min(BATCH_MAX_SIZE, len(self._items)))]
+            print(f"DEBUG: Re-evaluating {len(batch)} deferred Darknet messages")
+            version = prompt_version()
+            verdicts = await analyse_message_batch([text for text, _, _ in batch])
+
+            failed = []
+            for (text, callback, queued_at), verdict in zip(batch, verdicts):
+                reason = verdict.get("reason")
+                waited = time.monotonic() - queued_at
+                if reason == API_ERROR_REASON and waited < self.give_up_after:
+                    failed.append((text, callback, queued_at))
+                    continue
+
+                if reason in (API_ERROR_REASON, PARSE_ERROR_REASON):
+                    print(f"DEBUG: Giving up on re-evaluation after {waited / 60:.0f} min ({reason})")
+                    verdict = needs_review_verdict()
+                else:
+                    remember_verdict(text, verdict, version)
+                count_verdict("reevaluation", verdict)
+
+                try:
+                    await callback(dict(verdict, reevaluated=True))
+                except Exception as e:
+                    print(f"DEBUG: Re-evaluation callback failed: {e}")
+
+            if failed:
+                # Still failing: put them back in order and wait for the next probe
+                self._items.extendleft(reversed(failed))
+                await asyncio.sleep(max(breaker.retry_in(), REEVALUATION_RETRY_SECONDS))
+
+reevaluation_queue = ReevaluationQueue()
+
+registry.gauge(
+    "nyx_moderation_queue_depth", "Darknet messages waiting in each moderation queue.", ("queue",),
+    lambda: {("batch",): len(moderation_batcher), ("reevaluation",): len(reevaluation_queue)}
+)
+registry.gauge(
+    "nyx_moderation_breaker_open", "1 while the moderation circuit breaker is open or half-open.",
+    callback=lambda: 0 if breaker.state == CLOSED else 1
+)
+registry.gauge("nyx_moderation_breaker_trips", "Times the moderation circuit breaker opened.", callback=lambda: breaker.trips)
+registry.gauge(
+    "nyx_moderation_reevaluation_dropped", "Deferred Darknet messages dropped because the re-evaluation queue was full.",
+    callback=lambda: reevaluation_queue.dropped
+)
+
+# ---------------------------------------------------------
+# Darknet moderation pipeline
+# ---------------------------------------------------------
+async def moderate_message_text(message_text: str, on_reevaluated=None) -> dict:
+    """
+    Entry point used by bot.py for each Darknet relay line:
+    local pre-filter, exact verdict cache, near-duplicate reuse, and
+    only then the batched Gemini moderator.
+
+    If Gemini cannot answer, the message is never reported clean: a
+    verdict marked "deferred" is returned and, given `on_reevaluated`,
+    the message is queued and the real verdict delivered to it later.
+    An unreadable reply gives a verdict marked "needs_review".
+    """
+    local = prefilter.check_message(message_text)
+    if local is not None:
+        print("DEBUG: Pre-filter verdict:", "violation" if local["violation"] else "clean")
+        return count_verdict("prefilter", local)
+
+    cached = verdict_cache.get(message_text)
+    cache_lookup("verdict", cached is not None)
+    if cached is not None:
+        print("DEBUG: Verdict cache hit", verdict_cache.stats())
+        return count_verdict("verdict_cache", cached)
+
+    # Words or review terms the earlier message lacked always go back to the model.
+    # A reused verdict is not copied into the exact cache: it was never judged on this text
+    near = near_duplicates.find(message_text, prefilter.review_hits(message_text))
+    cache_lookup("near_duplicate", near is not None)
+    if near is not None:
+        analysis, similarity = near
+        print(f"DEBUG: Near-duplicate verdict reused (similarity {similarity:.2f})")
+        return count_verdict("near_duplicate", analysis)
+
+    version = prompt_version()
+    analysis = await moderation_batcher.submit(message_text)
+
+    # Never cache API failures
+    if analysis.get("reason") == API_ERROR_REASON:
+        if on_reevaluated is not None:
+            reevaluation_queue.add(message_text, on_reevaluated)
+        print(f"DEBUG: Moderation deferred (breaker {breaker.state}, {len(reevaluation_queue)} queued)")
+        return count_verdict("llm", deferred_verdict())
+
+    # Gemini answered but not with a verdict: retrying would likely repeat that
+    if analysis.get("reason") == PARSE_ERROR_REASON:
+        print("DEBUG: Unreadable moderation reply, flagging for manual review")
+        return count_verdict("llm", needs_review_verdict())
+
+    remember_verdict(message_text, analysis, version)
+    return count_verdict("llm", analysis)
@@ -0,0 +1,288 @@
+"""
+outbound.py — Batched outbound posts for Darknet moderation
+-----------------------------------------------------------
+
+Every Darknet verdict used to cost one or two Discord sends. Under heavy
+relay traffic that runs into the per-channel rate limit and buries real
+alerts under "No Violation Detected" embeds. ModerationDispatcher owns
+all verdict posts per channel instead:
+
+- violations go out first, as a single message carrying both the role
+  mention and the embed; alerts queued behind a rate-limited send are
+  merged into one message (up to ALERT_MAX_EMBEDS embeds and
+  ALERT_MAX_CHARS of embed text), and sent one by one if Discord
+  rejects the merged message
+- clean verdicts are collected into a rolling digest embed, sent every
+  DIGEST_INTERVAL_SECONDS (or once DIGEST_MAX_ENTRIES are waiting); the
+  last digest is edited in place only while nothing else has been posted
+  below it (bot.on_message reports every message via note_message) and it
+  has room, otherwise a fresh digest is posted
+- each channel has one sender paced by a local token bucket shaped like
+  Discord's per-channel limit, so bursts queue here rather than in 429s
+"""
+
+import time
+import asyncio
+from collections import deque
+from datetime import datetime, timezone
+import discord
+from metrics import registry, stage_timer
+
+DIGEST_INTERVAL_SECONDS = 30.0
+DIGEST_MAX_ENTRIES = 20
+DIGEST_LINE_CHARS = 150
+
+# Discord accepts at most 10 embeds per message, 6000 characters in total
+ALERT_MAX_EMBEDS = 10
+ALERT_MAX_CHARS = 6000
+
+# Discord allows about 5 messages per 5 seconds in one channel
+CHANNEL_BURST = 5
+CHANNEL_PER_SECONDS = 5.0
+
+outbound_calls = registry.counter(
+    "nyx_outbound_api_calls_total", "Discord calls made by the outbound dispatcher.", ("method",)
+)
+
+
+class ChannelRateLimiter:
+    def __init__(self, burst: int = CHANNEL_BURST, per_seconds: float = CHANNEL_PER_SECONDS):
+        self.burst = burst
+        self.rate = burst / per_seconds
+        self.tokens = float(burst)
+        self._updated = time.monotonic()
+
+    def wait_time(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    async def acquire(self):
+        while True:
+            wait = self.wait_time()
+            if wait <= 0:
+                self.tokens -= 1
+                return
+            await asyncio.sleep(wait)
+
+
+def digest_line(message_text: str, analysis: dict) -> str:
+    text = " ".join(message_text.split())
+    summary = analysis.get("short_summary", "Message appears compliant.")
+    line = f"• {text} — {summary}"
+    if analysis.get("reevaluated"):
+        line += " (re-evaluated)"
+    if len(line) > DIGEST_LINE_CHARS:
+        line = line[:DIGEST_LINE_CHARS - 1] + "…"
+    return line
+
+
+def build_digest_embed(lines: list[str]) -> discord.Embed:
+    embed = discord.Embed(
+        title="No Violation Detected",
+        description="\n".join(lines),
+        color=discord.Color.green()
+    )
+    embed.set_footer(text=f"{len(lines)} messages checked · updated {datetime.now(timezone.utc):%H:%M} UTC")
+    return embed
+
+
+class _Outbox:
+    def __init__(self, channel):
+        self.channel = channel
+        self.alerts: deque[tuple[discord.Embed, str | None, asyncio.Future]] = deque()
+        self.entries: list[str] = []
+        self.first_pending: float | None = None
+        self.force = False
+
+        # Current digest message and the lines it already shows; cleared
+        # once anything else is posted in the channel
+        self.digest_message = None
+        self.digest_lines: list[str] = []
+
+        self.limiter = ChannelRateLimiter()
+        self.wakeup = asyncio.Event()
+        self.drained = asyncio.Event()
+        self.task: asyncio.Task | None = None
+
+
+class ModerationDispatcher:
+    def __init__(self, interval: float = DIGEST_INTERVAL_SECONDS, max_entries: int = DIGEST_MAX_ENTRIES):
+        self.interval = interval
+        self.max_entries = max_entries
+        self.api_calls = 0
+        self._outboxes: dict[int, _Outbox] = {}
+
+    def _outbox(self, channel) -> _Outbox:
+        box = self._outboxes.get(channel.id)
+        if box is None:
+            box = self._outboxes[channel.id] = _Outbox(channel)
+        if box.task is None or box.task.done():
+            box.task = asyncio.create_task(self._run(box))
+        return box
+
+    def pending(self) -> dict[str, int]:
+        return {
+            "alert": sum(len(box.alerts) for box in self._outboxes.values()),
+            "clean": sum(len(box.entries) for box in self._outboxes.values())
+        }
+
+    # -----------------------------------------------------
+    # Producers
+    # -----------------------------------------------------
+    async def post_alert(self, channel, embed: discord.Embed, mention: str | None = None):
+        """Sends ahead of any digest; returns the message or raises the send error."""
+        box = self._outbox(channel)
+        future = asyncio.get_running_loop().create_future()
+        box.alerts.append((embed, mention, future))
+        box.drained.clear()
+        box.wakeup.set()
+        return await future
+
+    def add_clean(self, channel, line: str):
+        box = self._outbox(channel)
+        box.entries.append(line)
+        if box.first_pending is None:
+            box.first_pending = time.monotonic()
+        box.drained.clear()
+        box.wakeup.set()
+
+    def note_message(self, message):
+        """Called for every message seen in a channel; a digest buried under it is not edited again."""
+        box = self._outboxes.get(message.channel.id)
+        # Snowflake ids grow over time, so the digest's own echo does not count
+        if box is not None and box.digest_message is not None and message.id > box.digest_message.id:
+            box.digest_message = None
+            box.digest_lines = []
+
+    async def flush(self):
+        """Sends everything still pending right away, e.g. before shutdown."""
+        for box in list(self._outboxes.values()):
+            if box.alerts or box.entries:
+                box.force = True
+                box.wakeup.set()
+                await box.drained.wait()
+
+    # -----------------------------------------------------
+    # Sender (one per channel)
+    # -----------------------------------------------------
+    async def _call(self, box: _Outbox, method, limited: bool = True, **kwargs):
+        if limited:
+            await box.limiter.acquire()
+        self.api_calls += 1
+        outbound_calls.inc(method=method.__name__)
+        with stage_timer("discord_send", "moderation"):
+            return await method(**kwargs)
+
+    async def _run(self, box: _Outbox):
+        while True:
+            if box.alerts:
+                await self._send_alerts(box)
+                # Clean verdicts after an alert start a new digest below it
+                box.digest_message = None
+                continue
+
+            timeout = None
+            if box.entries:
+                due = box.first_pending + self.interval
+                if box.force or len(box.entries) >= self.max_entries or time.monotonic() >= due:
+                    await self._send_digest(box)
+                    continue
+                timeout = due - time.monotonic()
+            else:
+                box.force = False
+                box.drained.set()
+
+            box.wakeup.clear()
+            try:
+                await asyncio.wait_for(box.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _next_alert_batch(self, box: _Outbox) -> list:
+        batch = [box.alerts.popleft()]
+        chars = len(batch[0][0])
+        while box.alerts and len(batch) < ALERT_MAX_EMBEDS and chars + len(box.alerts[0][0]) <= ALERT_MAX_CHARS:
+            chars += len(box.alerts[0][0])
+            batch.append(box.alerts.popleft())
+        return batch
+
+    async def _send_alert_message(self, box: _Outbox, batch: list, limited: bool = True):
+        mentions = []
+        for _, mention, _ in batch:
+            if mention and mention not in mentions:
+                mentions.append(mention)
+
+        message = await self._call(
+            box, box.channel.send, limited=limited,
+            content=" ".join(mentions) or None,
+            embeds=[embed for embed, _, _ in batch],
+            allowed_mentions=discord.AllowedMentions(roles=True)
+        )
+        for _, _, future in batch:
+            if not future.done():
+                future.set_result(message)
+
+    async def _send_alerts(self, box: _Outbox):
+        # Wait for the rate limit first, so alerts arriving meanwhile share the send
+        await box.limiter.acquire()
+        batch = self._next_alert_batch(box)
+
+        try:
+            await self._send_alert_message(box, batch, limited=False)
+            return
+        except discord.Forbidden as e:
+            error = e
+        except discord.HTTPException as e:
+            if len(batch) == 1:
+                error = e
+            else:
+                # e.g. a 400 for the merged message: don't lose the alerts with it
+                print(f"DEBUG: Merged alert message rejected ({e}), sending {len(batch)} alerts one by one")
+                await self._send_alerts_singly(box, batch)
+                return
+        except Exception as e:
+            error = e
+
+        for _, _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    async def _send_alerts_singly(self, box: _Outbox, batch: list):
+        for alert in batch:
+            try:
+                await self._send_alert_message(box, [alert])
+            except Exception as e:
+                if not alert[2].done():
+                    alert[2].set_exception(e)
+
+    async def _send_digest(self, box: _Outbox):
+        lines, box.entries = box.entries[:self.max_entries], box.entries[self.max_entries:]
+        box.first_pending = time.monotonic() if box.entries else None
+
+        try:
+            combined = box.digest_lines + lines
+            if box.digest_message is not None and len(combined) <= self.max_entries:
+                try:
+                    await self._call(box, box.digest_message.edit, embed=build_digest_embed(combined))
+                    box.digest_lines = combined
+                    return
+                except discord.NotFound:
+                    box.digest_message = None
+
+            box.digest_message = await self._call(box, box.channel.send, embed=build_digest_embed(lines))
+            box.digest_lines = lines
+
+        except discord.Forbidden:
+            print("Bot lacks permission to send embeds or mentions.")
+        except discord.HTTPException as e:
+            print(f"DEBUG: Clean verdict digest not sent: {e}")
+
+
+moderation_posts = ModerationDispatcher()
+
+registry.gauge(
+    "nyx_outbound_pending", "Verdict posts waiting for the outbound dispatcher.", ("kind",),
+    lambda: {(kind,): count for kind, count in moderation_posts.pending().items()}
+)
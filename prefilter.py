@@ -0,0 +1,97 @@
+"""
+prefilter.py — Local rule pre-filter for Darknet moderation
+-----------------------------------------------------------
+
+Some Darknet verdicts need no model at all: explicit rule 7 mentions
+(AOSharp, "Tube of Dangerous Matter", server crashing) are certain
+violations. There is no local clean verdict: a trade tag plus a price
+says nothing about the rest of the line, so everything else goes to
+Gemini.
+
+prefilter_rules.txt is compiled once into one combined regex for all
+violation + review patterns (named groups tell which pattern fired),
+scanned in a single pass.
+
+check_message() returns a violation verdict in the same shape as
+analyse_message_moderation(), or None when the message must go to
+Gemini. review_hits() lists the review terms in a message; the verdict
+caches use it so a near-duplicate never stands in for a model call.
+"""
+
+import re
+
+PREFILTER_FILE = "prefilter_rules.txt"
+
+VALID_KINDS = ("violation", "review")
+
+
+class PrefilterEngine:
+    def __init__(self, entries: list[tuple[str, str, str, str]]):
+        # entries: (kind, rule, recommended_action, pattern)
+        self._groups: dict[str, tuple[str, str, str]] = {}
+        scan_parts = []
+
+        for i, (kind, rule, action, pattern) in enumerate(entries):
+            re.compile(pattern)  # surface bad patterns with a clear traceback
+            name = f"p{i}"
+            self._groups[name] = (kind, rule, action)
+            scan_parts.append(f"(?P<{name}>{pattern})")
+
+        self._scan_re = re.compile("|".join(scan_parts), re.IGNORECASE) if scan_parts else None
+        self.pattern_count = len(entries)
+
+    def _matches(self, message_text: str):
+        if self._scan_re is None:
+            return
+        for match in self._scan_re.finditer(message_text.strip()):
+            kind, rule, action = self._groups[match.lastgroup]
+            yield kind, rule, action, match.group(0)
+
+    def check_message(self, message_text: str) -> dict | None:
+        for kind, rule, action, matched in self._matches(message_text):
+            if kind == "violation":
+                return violation_verdict(rule, action, matched)
+        return None
+
+    def review_hits(self, message_text: str) -> set[str]:
+        """Lowercased review-pattern matches in `message_text`."""
+        return {matched.lower() for kind, _, _, matched in self._matches(message_text) if kind == "review"}
+
+
+def violation_verdict(rule: str, action: str, matched: str) -> dict:
+    return {
+        "violation": True,
+        "rule": rule,
+        "reason": f"Message contains prohibited content: '{matched}'.",
+        "recommended_action": action or "Warning",
+        "short_summary": f"Automatic pre-filter match for rule {rule}: '{matched}'.",
+        "confidence": 1.0
+    }
+
+
+# ---------------------------------------------------------
+# Load pattern file
+# ---------------------------------------------------------
+def load_prefilter_entries(path: str = PREFILTER_FILE) -> list[tuple[str, str, str, str]]:
+    entries = []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line_no, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+
+                fields = [part.strip() for part in line.split("|", 3)]
+                if len(fields) != 4 or fields[0].lower() not in VALID_KINDS or not fields[3]:
+                    print(f"DEBUG: Skipping malformed pre-filter line {line_no}: {line}")
+                    continue
+
+                kind, rule, action, pattern = fields
+                entries.append((kind.lower(), rule, action, pattern))
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def load_prefilter(path: str = PREFILTER_FILE) -> PrefilterEngine:
+    return PrefilterEngine(load_prefilter_entries(path))
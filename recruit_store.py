@@ -0,0 +1,80 @@
+"""
+recruit_store.py — Durable recruit interview sessions
+-----------------------------------------------------
+
+A small SQLite store (WAL mode) holding one row per open interview, so a
+restart or crash does not drop applications in progress.
+
+Each row keeps what is needed to pick the interview back up: the
+applicant, the question index, the answers given so far and any reply
+still being typed (the debounce buffer). Rows are written on every state
+change and deleted when the interview is concluded or decided.
+
+load_all() returns every open session in a single query so startup can
+resume them in bulk.
+"""
+
+import json
+import sqlite3
+import time
+
+RECRUIT_DB_PATH = "nyx_recruit.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS recruit_sessions (
+    channel_id     INTEGER PRIMARY KEY,
+    user_id        INTEGER NOT NULL,
+    dm_mode        INTEGER NOT NULL,
+    question_index INTEGER NOT NULL,
+    answers        TEXT    NOT NULL,   -- JSON list
+    buffer         TEXT    NOT NULL,   -- JSON list
+    updated_at     INTEGER NOT NULL    -- epoch seconds
+);
+"""
+
+
+class RecruitSessionStore:
+    def __init__(self, path: str = RECRUIT_DB_PATH):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def save(self, channel_id: int, session: dict):
+        self.conn.execute(
+            "INSERT INTO recruit_sessions (channel_id, user_id, dm_mode, question_index, answers, buffer, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(channel_id) DO UPDATE SET user_id = excluded.user_id, dm_mode = excluded.dm_mode, "
+            "question_index = excluded.question_index, answers = excluded.answers, "
+            "buffer = excluded.buffer, updated_at = excluded.updated_at",
+            (
+                channel_id,
+                session["user_id"],
+                int(session["dm_mode"]),
+                session["question_index"],
+                json.dumps(session["answers"]),
+                json.dumps(session["buffer"]),
+                int(time.time())
+            )
+        )
+        self.conn.commit()
+
+    def delete(self, channel_id: int):
+        self.conn.execute("DELETE FROM recruit_sessions WHERE channel_id = ?", (channel_id,))
+        self.conn.commit()
+
+    def load_all(self) -> dict[int, dict]:
+        sessions = {}
+        rows = self.conn.execute(
+            "SELECT channel_id, user_id, dm_mode, question_index, answers, buffer FROM recruit_sessions"
+        )
+        for channel_id, user_id, dm_mode, question_index, answers, buffer in rows:
+            sessions[channel_id] = {
+                "user_id": user_id,
+                "dm_mode": bool(dm_mode),
+                "question_index": question_index,
+                "answers": json.loads(answers),
+                "buffer": json.loads(buffer)
+            }
+        return sessions
@@ -0,0 +1,146 @@
+"""
+redflags.py — Red-flag scoring for recruitment answers
+------------------------------------------------------
+
+redflag_lexicon.txt is compiled once into lookup tables:
+- single words and multi-word phrases, keyed by their word tokens
+- prefix terms ("kill*"), keyed by prefix
+
+score_answers() tokenizes each answer once and looks up every position,
+so matching is on whole words and the cost depends on the answer length,
+not on the number of lexicon terms.
+
+Every match adds its category weight to the score; the total decides the
+risk level shown in the officer summary.
+"""
+
+import re
+
+LEXICON_FILE = "redflag_lexicon.txt"
+
+# Defaults when the lexicon does not set them
+RISK_MEDIUM_THRESHOLD = 1
+RISK_HIGH_THRESHOLD = 3
+
+RISK_LOW = "🟢 **Low Risk** — No concerning language detected."
+RISK_MEDIUM = "🟡 **Medium Risk** — Some concerning language detected."
+RISK_HIGH = "🔴 **High Risk** — Multiple or severe red flags detected."
+
+_TOKEN_RE = re.compile(r"[\w']+")
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN_RE.findall(text.lower().replace("’", "'"))
+
+
+class RedFlagScorer:
+    def __init__(self, entries: list[tuple[str, str]], weights: dict[str, int],
+                 medium: int = RISK_MEDIUM_THRESHOLD, high: int = RISK_HIGH_THRESHOLD):
+        # entries: (category, term)
+        self.weights = weights
+        self.medium = medium
+        self.high = high
+        self._phrases: dict[tuple[str, ...], str] = {}
+        self._prefixes: dict[str, str] = {}
+
+        for category, term in entries:
+            if term.endswith("*"):
+                self._prefixes[term[:-1].lower()] = category
+            else:
+                tokens = tuple(tokenize(term))
+                if tokens:
+                    self._phrases[tokens] = category
+
+        self._phrase_lengths = sorted({len(p) for p in self._phrases}, reverse=True)
+        self._prefix_lengths = sorted({len(p) for p in self._prefixes}, reverse=True)
+        self.term_count = len(self._phrases) + len(self._prefixes)
+
+    def _match_at(self, tokens: list[str], i: int) -> tuple[str, str, int] | None:
+        # Longest phrase first, then the longest prefix of the word
+        for n in self._phrase_lengths:
+            phrase = tuple(tokens[i:i + n])
+            category = self._phrases.get(phrase)
+            if category is not None and len(phrase) == n:
+                return " ".join(phrase), category, n
+        word = tokens[i]
+        for n in self._prefix_lengths:
+            category = self._prefixes.get(word[:n]) if len(word) >= n else None
+            if category is not None:
+                return word, category, 1
+        return None
+
+    def scan(self, text: str) -> list[tuple[str, str]]:
+        """Returns (matched text, category) for every lexicon hit in `text`."""
+        tokens = tokenize(text)
+        matches = []
+        i = 0
+        while i < len(tokens):
+            match = self._match_at(tokens, i)
+            if match is None:
+                i += 1
+                continue
+            matched, category, length = match
+            matches.append((matched, category))
+            i += length
+        return matches
+
+    def risk_level(self, score: int) -> str:
+        if score >= self.high:
+            return RISK_HIGH
+        if score >= self.medium:
+            return RISK_MEDIUM
+        return RISK_LOW
+
+    def score_answers(self, answers: list[str]) -> tuple[list[str], str]:
+        """
+        Scores all answers in one pass.
+        Returns (flag lines for the officer summary, risk level text).
+        """
+        flags = []
+        score = 0
+        for i, answer in enumerate(answers, start=1):
+            for matched, category in self.scan(answer):
+                flags.append(f"Q{i}: '{answer}' — matched **{matched}** ({category})")
+                score += self.weights.get(category, 1)
+        return flags, self.risk_level(score)
+
+
+# ---------------------------------------------------------
+# Load lexicon file
+# ---------------------------------------------------------
+def load_red_flag_scorer(path: str = LEXICON_FILE) -> RedFlagScorer:
+    entries = []
+    weights: dict[str, int] = {}
+    thresholds = {"medium": RISK_MEDIUM_THRESHOLD, "high": RISK_HIGH_THRESHOLD}
+
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line_no, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+
+                fields = [part.strip() for part in line.split("|", 2)]
+                if len(fields) != 3:
+                    print(f"DEBUG: Skipping malformed lexicon line {line_no}: {line}")
+                    continue
+
+                category, value, terms = fields
+                category = category.lower()
+                try:
+                    number = int(terms if category == "risk" else value)
+                except ValueError:
+                    print(f"DEBUG: Skipping malformed lexicon line {line_no}: {line}")
+                    continue
+
+                if category == "risk":
+                    if value.lower() in thresholds:
+                        thresholds[value.lower()] = number
+                    continue
+
+                weights[category] = number
+                entries.extend((category, term.strip()) for term in terms.split(",") if term.strip())
+    except FileNotFoundError:
+        pass
+
+    return RedFlagScorer(entries, weights, thresholds["medium"], thresholds["high"])
@@ -0,0 +1,159 @@
+"""
+resilience.py — Circuit breaker and hedged calls for latency-critical LLM use
+------------------------------------------------------------------------------
+
+CircuitBreaker watches the outcome of recent calls. When too many fail
+or are too slow it opens, and callers fail fast instead of queueing
+behind a struggling provider. After a cooldown one probe is let through
+(half-open); success closes the breaker again.
+
+LatencyTracker keeps recent call durations so the hedge delay can follow
+the observed p95 instead of a fixed guess.
+
+hedged() runs a primary call and, if it has not answered within
+`hedge_after` seconds, starts a backup (e.g. a cheaper fallback model);
+the first successful answer wins and the other call is cancelled.
+"""
+
+import time
+import asyncio
+from collections import deque
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class CircuitBreaker:
+    def __init__(self, window: int = 20, min_calls: int = 5, failure_ratio: float = 0.5,
+                 slow_ratio: float = 0.8, slow_seconds: float = 10.0, cooldown: float = 30.0):
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.slow_ratio = slow_ratio
+        self.slow_seconds = slow_seconds
+        self.cooldown = cooldown
+
+        self.state = CLOSED
+        self.trips = 0
+        self._outcomes: deque[tuple[bool, bool]] = deque(maxlen=window)  # (failed, slow)
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._listeners = []
+
+    def on_close(self, callback):
+        """callback() is called each time the breaker closes after being open."""
+        self._listeners.append(callback)
+
+    def retry_in(self) -> float:
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + self.cooldown - time.monotonic())
+
+    def accepting(self) -> bool:
+        """Whether allow() would let a call through now, without claiming the probe."""
+        if self.state == CLOSED:
+            return True
+        return self.retry_in() <= 0 and not self._probe_in_flight
+
+    def allow(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and self.retry_in() > 0:
+            return False
+        # Cooldown over: let a single probe through
+        if self._probe_in_flight:
+            return False
+        self.state = HALF_OPEN
+        self._probe_in_flight = True
+        return True
+
+    def record_success(self, seconds: float):
+        self._record(False, seconds >= self.slow_seconds)
+
+    def record_failure(self):
+        self._record(True, False)
+
+    def _record(self, failed: bool, slow: bool):
+        if self.state == HALF_OPEN:
+            self._probe_in_flight = False
+            if failed or slow:
+                self._open()
+            else:
+                self._close()
+            return
+
+        self._outcomes.append((failed, slow))
+        if len(self._outcomes) < self.min_calls:
+            return
+        failures = sum(1 for f, _ in self._outcomes if f)
+        slows = sum(1 for _, s in self._outcomes if s)
+        if failures >= self.failure_ratio * len(self._outcomes) or slows >= self.slow_ratio * len(self._outcomes):
+            self._open()
+
+    def _open(self):
+        if self.state != OPEN:
+            self.trips += 1
+            print(f"DEBUG: Circuit breaker opened (trip {self.trips})")
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+
+    def _close(self):
+        print("DEBUG: Circuit breaker closed")
+        self.state = CLOSED
+        self._outcomes.clear()
+        for callback in self._listeners:
+            callback()
+
+
+class LatencyTracker:
+    def __init__(self, samples: int = 200):
+        self._samples: deque[float] = deque(maxlen=samples)
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, fraction: float, default: float) -> float:
+        if len(self._samples) < 10:
+            return default
+        ordered = sorted(self._samples)
+        return ordered[int(fraction * (len(ordered) - 1))]
+
+
+async def hedged(primary, backup, hedge_after: float):
+    """
+    primary and backup are zero-argument coroutine functions.
+    Returns (result, "primary" | "backup"). Raises the last error if
+    both fail.
+    """
+    tasks = {asyncio.ensure_future(primary()): "primary"}
+    backup_started = False
+    error: BaseException | None = None
+
+    try:
+        while tasks:
+            timeout = None if backup_started else hedge_after
+            done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+            if not done:
+                # Primary is past its budget: race it against the backup
+                tasks[asyncio.ensure_future(backup())] = "backup"
+                backup_started = True
+                continue
+
+            for task in done:
+                source = tasks.pop(task)
+                if task.exception() is None:
+                    return task.result(), source
+                error = task.exception()
+
+            # Primary failed before the hedge point: try the backup now
+            if not backup_started:
+                tasks[asyncio.ensure_future(backup())] = "backup"
+                backup_started = True
+
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,429 @@
+"""
+summaries.py — Gemini summaries for $summary
+--------------------------------------------
+
+Modules included:
+- Plain summaries and topic analysis (summarise_text, summarise_topics)
+- Hierarchical window summaries for daily/weekly/monthly (summarize_window)
+- Result cache for finished $summary responses (SummaryResultCache)
+- Token-budgeted map-reduce for inputs larger than one prompt
+- Single-flight coalescing of identical in-flight requests (SingleFlight)
+
+Window summaries are built from a rolling summary tree instead of raw
+messages. Each closed hour of a channel is summarized once and persisted
+in the message store; each closed UTC day is summarized once from its
+hourly summaries (or from its raw messages if those are missing). A
+window is then answered by combining at most ~30 day summaries plus the
+hour summaries at its edges and the still-open hour, so cost stays
+roughly constant however long the window is.
+
+A stored bucket summary records how many messages it covered; if late
+or backfilled messages change that count, the bucket is rebuilt.
+"""
+
+import time
+import asyncio
+from collections import OrderedDict
+from datetime import datetime, timezone
+from llm import generate_content, estimate_tokens, MODELS
+from message_store import MessageStore, to_epoch_ms
+from metrics import stage_timer
+
+SUMMARY_MODEL = MODELS["summary"]
+
+HOUR_MS = 60 * 60 * 1000
+DAY_MS = 24 * HOUR_MS
+
+# Word limits for tree nodes and the final window summary
+BUCKET_SUMMARY_WORDS = 60
+WINDOW_SUMMARY_WORDS = 100
+
+# Finished $summary responses are reused for this long while the
+# channel has no newer messages
+RESULT_CACHE_SIZE = 200
+RESULT_CACHE_TTL_SECONDS = 15 * 60
+
+SUMMARY_ERROR = "Summary unavailable due to AI error."
+TOPICS_ERROR = "Topic analysis unavailable due to AI error."
+
+# Map-reduce: inputs estimated above SUMMARY_CHUNK_TOKENS are split on
+# message boundaries, chunks are summarized concurrently (at most
+# SUMMARY_MAX_PARALLEL_CHUNKS at a time) and the partials are combined.
+# If any chunk fails the whole summary fails, rather than covering less.
+# Token counts use llm.estimate_tokens, the same estimate the scheduler budgets with.
+SUMMARY_CHUNK_TOKENS = 24000
+SUMMARY_MAX_PARALLEL_CHUNKS = 4
+
+Piece = tuple[str, str]  # (period label, summary)
+
+
+async def _generate(prompt: str) -> str | None:
+    try:
+        response = await generate_content(
+            model=SUMMARY_MODEL,
+            contents=[{"role": "user", "parts": [{"text": prompt}]}],
+            priority="summary"
+        )
+        return (response.text or "").strip() or None
+
+    except Exception:
+        return None
+
+def _format_messages(messages: list[tuple[str, str, datetime]]) -> str:
+    with stage_timer("prompt_build", "summary"):
+        return "\n".join([f"{author}: {content}" for author, content, ts in messages])
+
+# ---------------------------------------------------------
+# GEMINI SUMMARIZER
+# ---------------------------------------------------------
+async def summarise_text(text: str) -> str:
+    prompt = (
+        "Summarize the following Discord messages in under 100 words. "
+        "Include usernames when relevant. Focus on the main themes and actions.\n\n"
+        + text
+    )
+    return await _generate(prompt) or SUMMARY_ERROR
+
+# ---------------------------------------------------------
+# GEMINI TOPIC ANALYSIS
+# ---------------------------------------------------------
+async def summarise_topics(text: str) -> str:
+    prompt = (
+        "Identify the main discussion topics in the following Discord messages. "
+        "List 3–6 themes with short explanations. "
+        "Do NOT include usernames.\n\n"
+        + text
+    )
+    return await _generate(prompt) or TOPICS_ERROR
+
+# ---------------------------------------------------------
+# Build summary text from message tuples
+# ---------------------------------------------------------
+async def summarize_messages(messages: list[tuple[str, str, datetime]]) -> str:
+    if not messages:
+        return "No messages available to summarize."
+
+    text_block = _format_messages(messages)
+    if estimate_tokens(text_block) <= SUMMARY_CHUNK_TOKENS:
+        return await summarise_text(text_block)
+
+    return await map_reduce_summary(messages, WINDOW_SUMMARY_WORDS) or SUMMARY_ERROR
+
+# ---------------------------------------------------------
+# Token-budgeted map-reduce
+# ---------------------------------------------------------
+def chunk_messages(messages: list[tuple[str, str, datetime]], budget: int = SUMMARY_CHUNK_TOKENS) -> list[list[tuple[str, str, datetime]]]:
+    # Greedy split on message boundaries; an oversized message gets its own chunk
+    chunks = []
+    current = []
+    used = 0
+    for msg in messages:
+        cost = estimate_tokens(f"{msg[0]}: {msg[1]}\n")
+        if current and used + cost > budget:
+            chunks.append(current)
+            current, used = [], 0
+        current.append(msg)
+        used += cost
+    if current:
+        chunks.append(current)
+    return chunks
+
+async def _bounded_gather(coroutines) -> list:
+    limit = asyncio.Semaphore(SUMMARY_MAX_PARALLEL_CHUNKS)
+
+    async def run(coroutine):
+        async with limit:
+            return await coroutine
+
+    return await asyncio.gather(*(run(c) for c in coroutines))
+
+async def map_reduce_summary(messages: list[tuple[str, str, datetime]], words: int) -> str | None:
+    chunks = chunk_messages(messages)
+    if len(chunks) == 1:
+        return await _summarise_chunk(chunks[0], words)
+
+    print(f"DEBUG: Summarizing {len(messages)} messages in {len(chunks)} chunks")
+    partials = await _bounded_gather(_summarise_chunk(chunk, BUCKET_SUMMARY_WORDS) for chunk in chunks)
+    # A summary missing a chunk would still read as covering the whole range
+    if not all(partials):
+        print(f"DEBUG: {partials.count(None)} of {len(chunks)} chunk summaries failed")
+        return None
+    pieces = [(f"part {i}", p) for i, p in enumerate(partials, start=1)]
+    return await _combine(pieces, words)
+
+# ---------------------------------------------------------
+# Summary tree
+# ---------------------------------------------------------
+async def _summarise_chunk(messages: list[tuple[str, str, datetime]], words: int) -> str | None:
+    prompt = (
+        f"Summarize the following Discord messages from a single time period in under {words} words. "
+        "Include usernames when relevant. Focus on the main themes and actions.\n\n"
+        + _format_messages(messages)
+    )
+    return await _generate(prompt)
+
+async def _summarise_bucket(messages: list[tuple[str, str, datetime]]) -> str | None:
+    return await map_reduce_summary(messages, BUCKET_SUMMARY_WORDS)
+
+async def _passthrough(summary: str) -> str:
+    return summary
+
+async def _combine(pieces: list[Piece], words: int) -> str | None:
+    """
+    Combines time-ordered partial summaries. If they do not fit one
+    prompt, adjacent groups are combined first (recursively).
+    """
+    blocks = [f"[{label}]\n{summary}" for label, summary in pieces]
+
+    groups: list[list[Piece]] = [[]]
+    used = 0
+    for piece, block in zip(pieces, blocks):
+        cost = estimate_tokens(block)
+        # At least two pieces per group so every round shrinks the list
+        if len(groups[-1]) >= 2 and used + cost > SUMMARY_CHUNK_TOKENS:
+            groups.append([])
+            used = 0
+        groups[-1].append(piece)
+        used += cost
+
+    if len(groups) > 1:
+        merged = await _bounded_gather(
+            _combine(group, BUCKET_SUMMARY_WORDS) if len(group) > 1 else _passthrough(group[0][1])
+            for group in groups
+        )
+        if not all(merged):
+            return None
+        pieces = [(f"{group[0][0]} – {group[-1][0]}", m) for group, m in zip(groups, merged)]
+        if len(pieces) == 1:
+            return pieces[0][1]
+        return await _combine(pieces, words)
+
+    prompt = (
+        "The following are summaries of consecutive time periods of a Discord channel, oldest first. "
+        f"Combine them into one summary of the whole period in under {words} words. "
+        "Include usernames when relevant. Focus on the main themes and actions.\n\n"
+        + "\n\n".join(blocks)
+    )
+    return await _generate(prompt)
+
+def _label(start_ms: int, level: str) -> str:
+    start = datetime.fromtimestamp(start_ms / 1000, tz=timezone.utc)
+    return start.strftime("%Y-%m-%d") if level == "day" else start.strftime("%Y-%m-%d %H:00 UTC")
+
+async def _hour_summaries(store: MessageStore, channel_id: int, hours: list[int], counts: dict[int, int]) -> dict[int, str]:
+    hours = [h for h in hours if counts.get(h)]
+    if not hours:
+        return {}
+
+    cached = store.get_bucket_summaries(channel_id, "hour", hours[0], hours[-1] + HOUR_MS)
+    result: dict[int, str] = {}
+
+    async def build(hour: int):
+        summary = await _summarise_bucket(store.between(channel_id, hour, hour + HOUR_MS))
+        if summary:
+            store.save_bucket_summary(channel_id, "hour", hour, counts[hour], summary)
+            result[hour] = summary
+
+    todo = []
+    for hour in hours:
+        entry = cached.get(hour)
+        if entry and entry[0] == counts[hour]:
+            result[hour] = entry[1]
+        else:
+            todo.append(hour)
+
+    await asyncio.gather(*(build(hour) for hour in todo))
+    return result
+
+async def _day_summaries(store: MessageStore, channel_id: int, days: list[int], counts: dict[int, int]) -> dict[int, str]:
+    if not days:
+        return {}
+
+    day_counts = {
+        day: sum(counts.get(h, 0) for h in range(day, day + DAY_MS, HOUR_MS))
+        for day in days
+    }
+    cached = store.get_bucket_summaries(channel_id, "day", days[0], days[-1] + DAY_MS)
+    result: dict[int, str] = {}
+
+    async def build(day: int):
+        hours = store.get_bucket_summaries(channel_id, "hour", day, day + DAY_MS)
+        non_empty = [h for h in range(day, day + DAY_MS, HOUR_MS) if counts.get(h)]
+
+        if all(h in hours and hours[h][0] == counts[h] for h in non_empty):
+            pieces = [(_label(h, "hour"), hours[h][1]) for h in non_empty]
+            summary = pieces[0][1] if len(pieces) == 1 else await _combine(pieces, BUCKET_SUMMARY_WORDS)
+        else:
+            summary = await _summarise_bucket(store.between(channel_id, day, day + DAY_MS))
+
+        if summary:
+            store.save_bucket_summary(channel_id, "day", day, day_counts[day], summary)
+            result[day] = summary
+
+    todo = []
+    for day in days:
+        if not day_counts[day]:
+            continue
+        entry = cached.get(day)
+        if entry and entry[0] == day_counts[day]:
+            result[day] = entry[1]
+        else:
+            todo.append(day)
+
+    await asyncio.gather(*(build(day) for day in todo))
+    return result
+
+async def rollup_window(store: MessageStore, channel_id: int, cutoff: datetime) -> tuple[list[Piece], bool]:
+    """
+    Summarizes (and persists) every closed bucket from the hour containing
+    `cutoff` up to the current hour. Whole UTC days use day buckets, the
+    partial days at either edge use hour buckets. Returns the pieces
+    oldest-first, and False as well if any non-empty bucket could not be
+    summarized. The store must already be synced for the window.
+    """
+    now_ms = to_epoch_ms(datetime.now(timezone.utc))
+    start = to_epoch_ms(cutoff) // HOUR_MS * HOUR_MS
+    open_hour = now_ms // HOUR_MS * HOUR_MS
+    if start >= open_hour:
+        return [], True
+
+    counts = store.bucket_counts(channel_id, start, open_hour, HOUR_MS)
+
+    first_day = -(-start // DAY_MS) * DAY_MS
+    today = open_hour // DAY_MS * DAY_MS
+    if first_day < today:
+        days = list(range(first_day, today, DAY_MS))
+        hours = list(range(start, first_day, HOUR_MS)) + list(range(today, open_hour, HOUR_MS))
+    else:
+        days = []
+        hours = list(range(start, open_hour, HOUR_MS))
+
+    hour_result, day_result = await asyncio.gather(
+        _hour_summaries(store, channel_id, hours, counts),
+        _day_summaries(store, channel_id, days, counts)
+    )
+
+    expected_hours = sum(1 for h in hours if counts.get(h))
+    expected_days = sum(1 for d in days if any(counts.get(h) for h in range(d, d + DAY_MS, HOUR_MS)))
+    complete = len(hour_result) == expected_hours and len(day_result) == expected_days
+
+    pieces = [(h, _label(h, "hour"), s) for h, s in hour_result.items()]
+    pieces += [(d, _label(d, "day"), s) for d, s in day_result.items()]
+    pieces.sort()
+    return [(label, summary) for _, label, summary in pieces], complete
+
+def current_bucket_start() -> datetime:
+    now_ms = to_epoch_ms(datetime.now(timezone.utc))
+    return datetime.fromtimestamp(now_ms // HOUR_MS * HOUR_MS / 1000, tz=timezone.utc)
+
+async def summarize_window(
+    store: MessageStore,
+    channel_id: int,
+    cutoff: datetime,
+    recent_messages: list[tuple[str, str, datetime]]
+) -> tuple[str, bool]:
+    """
+    Summary of everything since `cutoff`. `recent_messages` are the raw
+    messages of the still-open hour (since current_bucket_start()).
+    Also returns False if some hours or days could not be summarized and
+    are missing from it; such a summary must not be cached as complete.
+    """
+    pieces, complete = await rollup_window(store, channel_id, cutoff)
+
+    if recent_messages:
+        recent = await _summarise_bucket(recent_messages)
+        if recent:
+            pieces.append(("current hour", recent))
+        else:
+            complete = False
+
+    if not complete:
+        print(f"DEBUG: Window summary of {channel_id} is missing buckets that failed to summarize")
+    if not pieces:
+        return SUMMARY_ERROR, False
+    if len(pieces) == 1:
+        return pieces[0][1], complete
+
+    summary = await _combine(pieces, WINDOW_SUMMARY_WORDS)
+    if summary is None:
+        return SUMMARY_ERROR, False
+    return summary, complete
+
+# ---------------------------------------------------------
+# Result cache
+# ---------------------------------------------------------
+class SummaryResultCache:
+    """
+    Finished $summary responses keyed on
+    (channel ID, subcommand + arguments, newest message ID included).
+    A new message changes the key, so entries never go stale by content;
+    the TTL and size bound just keep memory in check.
+    """
+
+    def __init__(self, max_entries: int = RESULT_CACHE_SIZE, ttl: float = RESULT_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple, tuple[float, object]] = OrderedDict()
+
+    def get(self, key: tuple):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: tuple, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+# ---------------------------------------------------------
+# Single-flight
+# ---------------------------------------------------------
+class SingleFlight:
+    """
+    Runs one computation per key at a time. Callers arriving while it is
+    in flight await the same result instead of starting their own.
+    """
+
+    def __init__(self):
+        self.shared = 0
+        self._pending: dict[tuple, asyncio.Future] = {}
+
+    def in_flight(self) -> int:
+        return len(self._pending)
+
+    async def run(self, key: tuple, factory):
+        future = self._pending.get(key)
+        if future is not None:
+            self.shared += 1
+            # shield: a cancelled waiter must not cancel the shared work
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            result = await factory()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved; waiters still receive it
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._pending[key]
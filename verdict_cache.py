@@ -0,0 +1,260 @@
+"""
+verdict_cache.py — Darknet verdict cache
+----------------------------------------
+
+Trade spam on Darknet repeats the same body many times an hour. VerdictCache
+stores moderation verdicts keyed on a canonical form of the relay text so
+repeat posts are answered without a Gemini call.
+
+- Keys ignore case, whitespace and price/number noise
+- Bounded LRU with a per-entry TTL
+- Cleared automatically when the moderation prompt version changes
+  (rules.txt or moderationguide.txt edited, see moderation.py)
+- Hit/miss counters available via stats()
+
+SimHashIndex covers reposts that are *almost* the same (a different
+price, words left out): 64-bit SimHash fingerprints over word shingles,
+looked up through banded buckets so only a handful of candidates are
+compared. A close fingerprint is not enough on its own: a verdict is only
+reused when the new message adds no word the earlier one lacked (numbers
+and prices are already "#"), and no review term (see prefilter.py).
+Anything else, e.g. an insult appended to a trade line, goes back to the
+model.
+"""
+
+import re
+import time
+import hashlib
+from collections import OrderedDict
+
+VERDICT_CACHE_SIZE = 5000
+VERDICT_CACHE_TTL_SECONDS = 3600
+
+# Near-duplicate reuse: similarity = 1 - hamming_distance / SIMHASH_BITS.
+# With 8 bands of 8 bits, any pair within 7 differing bits shares a band,
+# so thresholds down to ~0.89 are found exactly.
+NEAR_DUPLICATE_THRESHOLD = 0.9
+NEAR_DUPLICATE_SIZE = 2000
+NEAR_DUPLICATE_TTL_SECONDS = 1800
+SIMHASH_BITS = 64
+SIMHASH_BANDS = 8
+
+# Prices and quantities: 5m, 1.5b, 200k, 12,000,000, QL 300, x3 ...
+_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)*(?:\s*(?:[kmb]|mil|mill|bil)\b)?")
+_RELAY_TAG_RE = re.compile(r"\s*\[[A-Za-z0-9_-]{3,20}\]\s*\[Ignore\]\s*$")
+_PUNCT_RE = re.compile(r"[^\w\s\[\]#]")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_message_text(text: str) -> str:
+    """
+    Canonical form of an extract_message_text() result, used as cache key.
+    "[WTS] Beast Armor QL300 - 5m!!  [Seller] [Ignore]" -> "[wts] beast armor ql# #"
+    """
+    text = _RELAY_TAG_RE.sub("", text)
+    text = text.lower()
+    text = _NUMBER_RE.sub("#", text)
+    text = _PUNCT_RE.sub(" ", text)
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+class _RulesBoundCache:
+    # Verdicts are only valid for the prompt version they were made under
+    def __init__(self, version_source=None):
+        self._version_source = version_source or (lambda: 0)
+        self._version = self._version_source()
+
+    def _check_rules_changed(self):
+        version = self._version_source()
+        if version != self._version:
+            print(f"DEBUG: Moderation prompt changed, clearing {type(self).__name__}")
+            self._version = version
+            self.clear()
+
+    def _outdated(self, version: int | None) -> bool:
+        # A verdict requested under an older prompt must not be stored under the new one
+        self._check_rules_changed()
+        return version is not None and version != self._version
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class VerdictCache(_RulesBoundCache):
+    def __init__(self, max_entries: int = VERDICT_CACHE_SIZE, ttl: float = VERDICT_CACHE_TTL_SECONDS,
+                 version_source=None):
+        super().__init__(version_source)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+
+    def get(self, message_text: str) -> dict | None:
+        self._check_rules_changed()
+        key = normalize_message_text(message_text)
+        entry = self._entries.get(key)
+
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return dict(entry[1])
+
+    def put(self, message_text: str, verdict: dict, version: int | None = None):
+        """`version` is the prompt version the verdict was requested under; stale ones are skipped."""
+        key = normalize_message_text(message_text)
+        if not key or self._outdated(version):
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, dict(verdict))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+            "hit_rate": (self.hits / total) if total else 0.0
+        }
+
+
+# ---------------------------------------------------------
+# Near-duplicate index (SimHash + banded lookup)
+# ---------------------------------------------------------
+def _shingles(normalized: str) -> list[str]:
+    tokens = normalized.split()
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+def _words(normalized: str) -> frozenset:
+    return frozenset(normalized.split()) - {"#"}
+
+
+def simhash(message_text: str) -> int:
+    weights = [0] * SIMHASH_BITS
+    for shingle in _shingles(normalize_message_text(message_text)):
+        h = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if (h >> bit) & 1 else -1
+
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+class SimHashIndex(_RulesBoundCache):
+    """
+    Recently moderated messages by SimHash fingerprint.
+    find() returns (verdict, similarity) for the closest prior message at or
+    above the threshold whose words and flags include all of the new
+    message's, or None.
+    Entries expire after `ttl` seconds and the oldest are dropped beyond
+    `max_entries`.
+    """
+
+    def __init__(
+        self,
+        threshold: float = NEAR_DUPLICATE_THRESHOLD,
+        max_entries: int = NEAR_DUPLICATE_SIZE,
+        ttl: float = NEAR_DUPLICATE_TTL_SECONDS,
+        version_source=None
+    ):
+        super().__init__(version_source)
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._band_width = SIMHASH_BITS // SIMHASH_BANDS
+        self._band_mask = (1 << self._band_width) - 1
+        self._next_id = 0
+        # entry id -> (expires_at, fingerprint, verdict, flags, words), oldest first
+        self._entries: OrderedDict[int, tuple[float, int, dict, frozenset, frozenset]] = OrderedDict()
+        self._buckets: dict[tuple[int, int], set[int]] = {}
+
+    def _bands(self, fingerprint: int):
+        for band in range(SIMHASH_BANDS):
+            yield band, (fingerprint >> (band * self._band_width)) & self._band_mask
+
+    def _remove(self, entry_id: int):
+        _, fingerprint, _, _, _ = self._entries.pop(entry_id)
+        for key in self._bands(fingerprint):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def _expire(self):
+        now = time.monotonic()
+        while self._entries:
+            entry_id, (expires_at, _, _, _, _) = next(iter(self._entries.items()))
+            if expires_at >= now and len(self._entries) <= self.max_entries:
+                break
+            self._remove(entry_id)
+
+    def find(self, message_text: str, flags: frozenset = frozenset()) -> tuple[dict, float] | None:
+        self._check_rules_changed()
+        self._expire()
+        fingerprint = simhash(message_text)
+        words = _words(normalize_message_text(message_text))
+
+        candidates: set[int] = set()
+        for key in self._bands(fingerprint):
+            candidates.update(self._buckets.get(key, ()))
+
+        best = None
+        best_similarity = self.threshold
+        for entry_id in candidates:
+            _, other, verdict, other_flags, other_words = self._entries[entry_id]
+            if not flags <= other_flags or not words <= other_words:
+                # The new text adds something the earlier one was judged without
+                continue
+            similarity = 1.0 - bin(fingerprint ^ other).count("1") / SIMHASH_BITS
+            if similarity >= best_similarity:
+                best, best_similarity = verdict, similarity
+
+        if best is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return dict(best), best_similarity
+
+    def add(self, message_text: str, verdict: dict, flags: frozenset = frozenset(), version: int | None = None):
+        normalized = normalize_message_text(message_text)
+        if not normalized or self._outdated(version):
+            return
+        fingerprint = simhash(message_text)
+        entry_id = self._next_id
+        self._next_id += 1
+
+        self._entries[entry_id] = (
+            time.monotonic() + self.ttl, fingerprint, dict(verdict), frozenset(flags), _words(normalized)
+        )
+        for key in self._bands(fingerprint):
+            self._buckets.setdefault(key, set()).add(entry_id)
+        self._expire()
+
+    def clear(self):
+        self._entries.clear()
+        self._buckets.clear()
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._entries)
+        }